@@ -0,0 +1 @@
+"""Shared helpers for the black-box test generation scripts."""
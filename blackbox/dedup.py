@@ -0,0 +1,96 @@
+import hashlib
+import os
+import random
+import re
+
+# Mersenne prime for the (a * x + b) mod p permutations
+_PRIME = (1 << 61) - 1
+NUM_PERM = 64
+BANDS = 16
+SHINGLE_SIZE = 3
+
+
+def parse_threshold(value):
+    """DEDUP_THRESHOLD setting as a float, or None when dedup is switched off"""
+    if value is None or str(value).strip().lower() in ("", "off", "0"):
+        return None
+    return float(value)
+
+
+DEDUP_THRESHOLD = parse_threshold(os.environ.get("DEDUP_THRESHOLD", "0.9"))
+
+
+def step_tokens(steps):
+    """Lowercased word tokens of a scenario's steps, with a marker between steps"""
+    tokens = []
+    for step in steps:
+        tokens.extend(re.findall(r"\w+", step.lower()))
+        tokens.append("|")
+    return tokens
+
+
+def shingles(tokens, size=SHINGLE_SIZE):
+    """Set of consecutive token tuples (the whole sequence when it is shorter than size)"""
+    if len(tokens) < size:
+        return {tuple(tokens)} if tokens else set()
+    return {tuple(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    """MinHash signatures whose agreement estimates the Jaccard similarity of shingle sets"""
+
+    def __init__(self, num_perm=NUM_PERM, seed=1):
+        rng = random.Random(seed)
+        self.permutations = [(rng.randrange(1, _PRIME), rng.randrange(0, _PRIME)) for _ in range(num_perm)]
+
+    def signature(self, shingle_set):
+        values = [
+            int.from_bytes(hashlib.blake2b(" ".join(shingle).encode("utf-8"), digest_size=8).digest(), "big")
+            for shingle in shingle_set
+        ]
+        if not values:
+            return None
+        return tuple(min((a * value + b) % _PRIME for value in values) for a, b in self.permutations)
+
+
+def similarity(signature, other):
+    """Estimated Jaccard similarity of two signatures"""
+    if signature is None or other is None:
+        return 0.0
+    return sum(x == y for x, y in zip(signature, other)) / len(signature)
+
+
+def cluster_near_duplicates(documents, threshold=None, num_perm=NUM_PERM, bands=BANDS):
+    """Group near-identical token sequences; returns clusters of indices, each led by its representative
+
+    Candidates come from locality-sensitive hashing over signature bands, so
+    the cost stays close to linear. An item joins the cluster of the first
+    earlier representative whose estimated similarity reaches threshold;
+    every member is therefore close to its representative, not just to
+    another member. threshold=None keeps every item in its own cluster.
+    """
+    if threshold is None:
+        return [[i] for i in range(len(documents))]
+
+    hasher = MinHasher(num_perm)
+    rows = num_perm // bands
+    buckets = {}
+    clusters = {}
+    for i, tokens in enumerate(documents):
+        signature = hasher.signature(shingles(tokens))
+        if signature is None:
+            clusters[i] = [i]
+            continue
+
+        band_keys = [(band, signature[band * rows:(band + 1) * rows]) for band in range(bands)]
+        candidates = sorted({rep for key in band_keys for rep, _ in buckets.get(key, ())})
+        lookup = {rep: rep_signature for key in band_keys for rep, rep_signature in buckets.get(key, ())}
+        representative = next((rep for rep in candidates if similarity(signature, lookup[rep]) >= threshold), None)
+        if representative is not None:
+            clusters[representative].append(i)
+            continue
+
+        clusters[i] = [i]
+        for key in band_keys:
+            buckets.setdefault(key, []).append((i, signature))
+    return [clusters[i] for i in sorted(clusters)]
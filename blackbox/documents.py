@@ -0,0 +1,88 @@
+import re
+
+# Numbered top-level headings: "1. Overview", "2. 🔐 Authentication System", "3.2 Tasks"
+NUMBERED_HEADING = re.compile(r"^\s*\d+(?:\.\d+)*\.?\s+\S.{0,80}$")
+# Bullet glyphs PDF extraction leaves in front of list items
+BULLETS = ("●", "○", "■", "▪", "•", "-", "*", "–")
+SUBHEADING_MAX_CHARS = 60
+
+
+def is_subheading(line):
+    """Short standalone line that is not a bullet, continuation, sentence or label ("🔑 Login")"""
+    text = line.strip()
+    return (
+        0 < len(text) <= SUBHEADING_MAX_CHARS
+        and not text.startswith(BULLETS)
+        and not text[0].islower()
+        and not text.endswith((".", ":", ",", ";"))
+        and not NUMBERED_HEADING.match(text)
+    )
+
+
+def _split_at(lines, is_heading):
+    """Split lines into blocks, each starting at a heading line (leading text forms its own block)"""
+    blocks = [[]]
+    for line in lines:
+        if is_heading(line) and any(existing.strip() for existing in blocks[-1]):
+            blocks.append([])
+        blocks[-1].append(line)
+    return [block for block in blocks if any(line.strip() for line in block)]
+
+
+def _pack_lines(lines, max_chars):
+    """Pack lines into consecutive blocks of at most max_chars (a longer single line stays whole)"""
+    blocks = [[]]
+    size = 0
+    for line in lines:
+        if blocks[-1] and size + len(line) + 1 > max_chars:
+            blocks.append([])
+            size = 0
+        blocks[-1].append(line)
+        size += len(line) + 1
+    return [block for block in blocks if block]
+
+
+def split_document_sections(doc_text, max_chars=6000):
+    """Split documentation into feature sections of at most max_chars, in document order
+
+    Sections start at numbered headings; oversized ones are split again at
+    short subheading lines, then packed line by line. Each section is a dict
+    with 'title' (its first line) and 'text'.
+    """
+    blocks = _split_at(doc_text.splitlines(), lambda line: NUMBERED_HEADING.match(line))
+    if len(blocks) > 1 and not NUMBERED_HEADING.match(next(line for line in blocks[0] if line.strip())):
+        # The document title / preamble introduces the first section
+        blocks[1] = blocks[0] + blocks[1]
+        del blocks[0]
+
+    sections = []
+    for block in blocks:
+        parts = [block]
+        if len("\n".join(block)) > max_chars:
+            parts = []
+            for sub_block in _split_at(block, is_subheading):
+                if len("\n".join(sub_block)) > max_chars:
+                    parts.extend(_pack_lines(sub_block, max_chars))
+                else:
+                    parts.append(sub_block)
+
+        # Merge neighbouring small parts back together while they fit
+        merged = []
+        for part in parts:
+            if merged and len("\n".join(merged[-1] + part)) <= max_chars:
+                merged[-1] = merged[-1] + part
+            else:
+                merged.append(list(part))
+
+        for part in merged:
+            if not any(line.strip() for line in part):
+                continue
+            title = next(line.strip() for line in part if line.strip())
+            sections.append({"title": title, "text": "\n".join(part).strip()})
+    return sections
+
+
+def outline_query(section):
+    """Retrieval query describing a section: its title and subheadings"""
+    headings = [line.strip() for line in section["text"].splitlines()[1:] if is_subheading(line)]
+    return " ".join([section["title"]] + headings)
@@ -0,0 +1,391 @@
+import io
+import re
+
+STEP_KEYWORDS = ('Given', 'When', 'Then', 'And', 'But', '*')
+SCENARIO_KEYWORDS = ('Scenario Outline', 'Scenario Template', 'Scenario', 'Example')
+EXAMPLES_KEYWORDS = ('Examples', 'Scenarios')
+DOC_STRING_DELIMITERS = ('"""', '```')
+
+
+def _keyword_line(line, keywords):
+    """Return (keyword, rest) if line starts with 'Keyword:', else None"""
+    for keyword in keywords:
+        if line.startswith(keyword + ':'):
+            return keyword, line[len(keyword) + 1:].strip()
+    return None
+
+
+def _step_line(line):
+    """Return (keyword, text) if line is a step, else None"""
+    for keyword in STEP_KEYWORDS:
+        if line == keyword or line.startswith(keyword + ' '):
+            return keyword, line[len(keyword):].strip()
+    return None
+
+
+def _table_row(line):
+    return [cell.strip() for cell in line.strip()[1:-1].split('|')]
+
+
+def iter_scenarios(handle):
+    """Lazily yield every scenario of a feature read from a binary file handle
+
+    Supports Feature/Rule/Background, Scenario, Scenario Outline with
+    Examples, Given/When/Then/And/But/* steps, tags, doc strings, data
+    tables and comments. Each scenario is a dict:
+
+        name, keyword ('Scenario' / 'Scenario Outline' / ...), tags, feature,
+        steps ({'keyword', 'text', 'line', 'doc_string', 'data_table'}),
+        background (steps of the Background in scope), examples
+        ({'name', 'tags', 'header', 'rows'}), line (1-based line of the
+        keyword), offset / end_offset (byte span of the scenario including
+        its tags) and background_offsets (byte offsets of the Feature and
+        Rule Backgrounds in scope, outermost first)
+
+    Byte offsets can be passed to read_scenario to re-parse one scenario
+    without reading the rest of the file.
+    """
+    feature = None
+    feature_background = []
+    feature_background_offsets = []
+    background = []
+    background_offsets = []
+    in_rule = False
+    current = None
+    section = None          # 'background', 'scenario' or 'examples'
+    last_step = None
+    pending_tags = []
+    pending_offset = None
+    doc_string = None       # (delimiter, indent, lines) while inside a doc string
+
+    offset = 0
+    line_number = 0
+
+    def finish(end_offset):
+        if current is not None:
+            current['end_offset'] = end_offset
+        return current
+
+    for raw in iter(handle.readline, b''):
+        line_start = offset
+        offset += len(raw)
+        line_number += 1
+        text = raw.decode('utf-8', errors='replace').rstrip('\r\n')
+        line = text.strip()
+
+        if doc_string is not None:
+            delimiter, indent, lines = doc_string
+            if line == delimiter:
+                if last_step is not None:
+                    last_step['doc_string'] = '\n'.join(lines)
+                doc_string = None
+            else:
+                lines.append(text[indent:] if text[:indent].strip() == '' else text.strip())
+            continue
+
+        if not line or line.startswith('#'):
+            continue
+
+        if line.startswith('@'):
+            if pending_offset is None:
+                pending_offset = line_start
+            pending_tags.extend(tag for tag in line.split() if tag.startswith('@'))
+            continue
+
+        block_start = pending_offset if pending_offset is not None else line_start
+
+        header = _keyword_line(line, ('Feature', 'Rule', 'Background') + SCENARIO_KEYWORDS + EXAMPLES_KEYWORDS)
+        if header is not None:
+            keyword, name = header
+
+            if keyword in EXAMPLES_KEYWORDS:
+                if current is not None:
+                    current['examples'].append({'name': name, 'tags': pending_tags, 'header': [], 'rows': []})
+                section = 'examples'
+                last_step = None
+            else:
+                done = finish(block_start)
+                if done is not None:
+                    yield done
+                current = None
+                last_step = None
+
+                if keyword == 'Feature':
+                    feature = name
+                    section = None
+                    in_rule = False
+                    background = feature_background = []
+                    background_offsets = feature_background_offsets = []
+                elif keyword == 'Rule':
+                    # A Rule inherits the feature's background and may extend it
+                    section = None
+                    in_rule = True
+                    background = list(feature_background)
+                    background_offsets = list(feature_background_offsets)
+                elif keyword == 'Background':
+                    section = 'background'
+                    if in_rule:
+                        background = list(feature_background)
+                        background_offsets = feature_background_offsets + [block_start]
+                    else:
+                        background = feature_background = []
+                        background_offsets = feature_background_offsets = [block_start]
+                else:
+                    section = 'scenario'
+                    current = {
+                        'name': name,
+                        'keyword': keyword,
+                        'tags': pending_tags,
+                        'feature': feature,
+                        'steps': [],
+                        'background': list(background),
+                        'background_offsets': list(background_offsets),
+                        'examples': [],
+                        'line': line_number,
+                        'offset': block_start,
+                        'end_offset': None,
+                    }
+
+            pending_tags = []
+            pending_offset = None
+            continue
+
+        pending_tags = []
+        pending_offset = None
+
+        if line.startswith(DOC_STRING_DELIMITERS):
+            delimiter = line[:3]
+            doc_string = (delimiter, len(text) - len(text.lstrip()), [])
+            continue
+
+        if line.startswith('|'):
+            if section == 'examples' and current is not None and current['examples']:
+                examples = current['examples'][-1]
+                if examples['header']:
+                    examples['rows'].append(_table_row(line))
+                else:
+                    examples['header'] = _table_row(line)
+            elif last_step is not None:
+                last_step.setdefault('data_table', []).append(_table_row(line))
+            continue
+
+        step = _step_line(line)
+        if step is not None:
+            keyword, step_text = step
+            last_step = {'keyword': keyword, 'text': step_text, 'line': line_number, 'doc_string': None}
+            if section == 'background':
+                background.append(last_step)
+            elif section == 'scenario' and current is not None:
+                current['steps'].append(last_step)
+            continue
+
+        # Anything else is free-form description text
+
+    done = finish(offset)
+    if done is not None:
+        yield done
+
+
+def iter_scenarios_from_text(feature_content):
+    """iter_scenarios over an in-memory feature string"""
+    return iter_scenarios(io.BytesIO(feature_content.encode('utf-8')))
+
+
+def read_scenario(handle, offset, background_offsets=()):
+    """Seek to a scenario's byte offset and parse only that scenario
+
+    Pass the scenario's background_offsets to re-attach its Background steps
+    the way iter_scenarios does (the Feature's, then the Rule's own).
+    """
+    background = []
+    for background_offset in background_offsets:
+        handle.seek(background_offset)
+        background.extend(_read_block_steps(handle))
+
+    handle.seek(offset)
+    block = io.BytesIO()
+    seen_header = False
+    for raw in iter(handle.readline, b''):
+        line = raw.decode('utf-8', errors='replace').strip()
+        header = _keyword_line(line, ('Feature', 'Rule', 'Background') + SCENARIO_KEYWORDS)
+        if header is not None:
+            if seen_header:
+                break
+            seen_header = True
+        block.write(raw)
+
+    block.seek(0)
+    for scenario in iter_scenarios(block):
+        scenario['offset'] += offset
+        scenario['end_offset'] += offset
+        scenario['background'] = background
+        scenario['background_offsets'] = list(background_offsets)
+        return scenario
+    return None
+
+
+def _read_block_steps(handle):
+    """Read the steps of the Background block starting at the current position"""
+    block = io.BytesIO()
+    block.write(b'Scenario: background\n')
+    # Skip the 'Background:' line itself
+    handle.readline()
+    for raw in iter(handle.readline, b''):
+        line = raw.decode('utf-8', errors='replace').strip()
+        if _keyword_line(line, ('Feature', 'Rule', 'Background') + SCENARIO_KEYWORDS) or line.startswith('@'):
+            break
+        block.write(raw)
+    block.seek(0)
+    for scenario in iter_scenarios(block):
+        return scenario['steps']
+    return []
+
+
+def split_feature_blocks(feature_content):
+    """Split a feature into its header text and one source block per scenario
+
+    The header is everything before the first scenario (Feature line,
+    description, Background); each block runs up to the next scenario so
+    that concatenating header and blocks gives back the original text.
+    """
+    data = feature_content.encode('utf-8')
+    offsets = [scenario['offset'] for scenario in iter_scenarios_from_text(feature_content)]
+    if not offsets:
+        return feature_content, []
+
+    bounds = offsets + [len(data)]
+    header = data[:offsets[0]].decode('utf-8')
+    blocks = [data[start:end].decode('utf-8') for start, end in zip(bounds, bounds[1:])]
+    return header, blocks
+
+
+def common_prefix_length(sequences):
+    """Number of leading items shared by every sequence"""
+    sequences = list(sequences)
+    if not sequences:
+        return 0
+    length = 0
+    for items in zip(*sequences):
+        if any(item != items[0] for item in items[1:]):
+            break
+        length += 1
+    return length
+
+
+def lift_background(feature_content, min_steps=2):
+    """Move the steps every scenario starts with into a Background; returns (feature text, lifted steps)
+
+    Only plain steps are lifted (no data tables or doc strings), and only
+    when the feature has at least two scenarios, none of them outlines or
+    already under a Background. A scenario left starting with And/But gets
+    the keyword those steps continued. Otherwise the text is returned
+    unchanged with no lifted steps.
+    """
+    scenarios = list(iter_scenarios_from_text(feature_content))
+    if (
+        len(scenarios) < 2
+        or any(scenario['background'] or scenario['examples'] for scenario in scenarios)
+        or re.search(r'^\s*(Background|Rule):', feature_content, re.MULTILINE)
+    ):
+        return feature_content, []
+
+    # The shared prefix ends at the first step carrying a data table or doc string
+    length = common_prefix_length(
+        [(step['keyword'], step['text']) for step in scenario['steps']]
+        for scenario in scenarios
+    )
+    length = min(
+        next((position for position, step in enumerate(scenario['steps'][:length])
+              if step.get('data_table') or step.get('doc_string') is not None), length)
+        for scenario in scenarios
+    )
+    # Each scenario keeps at least one step of its own
+    length = min([length] + [len(scenario['steps']) - 1 for scenario in scenarios])
+    if length < min_steps:
+        return feature_content, []
+
+    lines = feature_content.split('\n')
+    drop = {step['line'] - 1 for scenario in scenarios for step in scenario['steps'][:length]}
+    for scenario in scenarios:
+        following = scenario['steps'][length]
+        if following['keyword'] in ('And', 'But'):
+            keyword = next(
+                (step['keyword'] for step in reversed(scenario['steps'][:length]) if step['keyword'] not in ('And', 'But', '*')),
+                'Given',
+            )
+            line = lines[following['line'] - 1]
+            lines[following['line'] - 1] = line.replace(following['keyword'], keyword, 1)
+
+    lifted = scenarios[0]['steps'][:length]
+    first = scenarios[0]['line'] - 1
+    while first > 0 and lines[first - 1].strip().startswith(('@', '#')):
+        first -= 1
+    indent = re.match(r'\s*', lines[scenarios[0]['line'] - 1]).group(0)
+    step_indent = re.match(r'\s*', lines[lifted[0]['line'] - 1]).group(0)
+    background = [f"{indent}Background:"] + [format_step(step, step_indent) for step in lifted] + ['']
+
+    output = lines[:first] + background + [line for number, line in enumerate(lines[first:], first) if number not in drop]
+    return '\n'.join(output), lifted
+
+
+def format_step(step, indent=''):
+    """Render a parsed step back to Gherkin, including its data table or doc string"""
+    lines = [f"{indent}{step['keyword']} {step['text']}".rstrip()]
+    for row in step.get('data_table') or []:
+        lines.append(f"{indent}  | {' | '.join(row)} |")
+    if step.get('doc_string') is not None:
+        lines.append(f'{indent}  """')
+        lines.extend(f"{indent}  {doc_line}" for doc_line in step['doc_string'].split('\n'))
+        lines.append(f'{indent}  """')
+    return '\n'.join(lines)
+
+
+def format_scenario(scenario, indent='  '):
+    """Render a parsed scenario back to Gherkin with its Background steps inlined, so it stands on its own"""
+    step_indent = indent + '  '
+    lines = [f"{indent}{' '.join(scenario['tags'])}"] if scenario['tags'] else []
+    lines.append(f"{indent}{scenario['keyword']}: {scenario['name']}".rstrip())
+    lines.extend(format_step(step, step_indent) for step in scenario['background'] + scenario['steps'])
+    for examples in scenario['examples']:
+        lines.append('')
+        if examples['tags']:
+            lines.append(f"{step_indent}{' '.join(examples['tags'])}")
+        lines.append(f"{step_indent}Examples: {examples['name']}".rstrip())
+        lines.extend(f"{step_indent}  | {' | '.join(row)} |" for row in [examples['header']] + examples['rows'])
+    return '\n'.join(lines)
+
+
+_PLACEHOLDER = re.compile(r'<([^<>]+)>')
+
+
+def expand_outline(scenario):
+    """Yield one concrete scenario per Examples row (plain scenarios are yielded as-is)"""
+    rows = [
+        (examples, row)
+        for examples in scenario['examples']
+        for row in examples['rows']
+    ]
+    if not rows:
+        yield scenario
+        return
+
+    for number, (examples, row) in enumerate(rows, 1):
+        values = dict(zip(examples['header'], row))
+
+        def substitute(value):
+            return _PLACEHOLDER.sub(lambda m: values.get(m.group(1), m.group(0)), value) if value else value
+
+        steps = []
+        for step in scenario['steps']:
+            concrete = dict(step, text=substitute(step['text']), doc_string=substitute(step['doc_string']))
+            if step.get('data_table'):
+                concrete['data_table'] = [[substitute(cell) for cell in table_row] for table_row in step['data_table']]
+            steps.append(concrete)
+
+        yield dict(
+            scenario,
+            name=f"{substitute(scenario['name'])} (example {number})",
+            tags=scenario['tags'] + examples['tags'],
+            steps=steps,
+            examples=[],
+        )
@@ -0,0 +1,183 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_DIR = Path(__file__).resolve().parent.parent / ".llm_cache"
+DEFAULT_MAX_BYTES = 512 * 1024 * 1024
+DEFAULT_MAX_AGE = 30 * 24 * 3600
+# Full directory scans (for expired entries) happen only every this many writes
+SWEEP_EVERY = 256
+
+
+def normalize_prompt(prompt):
+    """Normalize line endings and trailing whitespace so cosmetic edits still hit"""
+    lines = prompt.replace("\r\n", "\n").replace("\r", "\n").split("\n")
+    return "\n".join(line.rstrip() for line in lines).strip()
+
+
+def cache_key(model, options, prompt):
+    """Content address for a (model, options, normalized prompt) triple"""
+    material = json.dumps(
+        {"model": model, "options": options or {}, "prompt": normalize_prompt(prompt)},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class LLMCache:
+    """On-disk LLM response cache with size/age-based LRU eviction
+
+    The total size is scanned once and then tracked as entries are written,
+    so a write only walks the directory when the cache goes over budget or
+    every SWEEP_EVERY writes to drop expired entries.
+    """
+
+    def __init__(self, cache_dir=None, max_bytes=DEFAULT_MAX_BYTES, max_age=DEFAULT_MAX_AGE, bypass=False):
+        self.cache_dir = Path(cache_dir or DEFAULT_CACHE_DIR)
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._size = None
+        self._writes = 0
+        self._lock = threading.Lock()
+
+    def _path(self, key):
+        return self.cache_dir / key[:2] / f"{key}.json"
+
+    def get(self, model, options, prompt):
+        """Return the cached response, or None on a miss"""
+        if self.bypass:
+            return None
+
+        path = self._path(cache_key(model, options, prompt))
+        try:
+            if self.max_age and time.time() - path.stat().st_mtime > self.max_age:
+                path.unlink()
+                raise FileNotFoundError(path)
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            # Touch the entry so eviction treats it as recently used
+            os.utime(path)
+        except (OSError, json.JSONDecodeError):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.hits += 1
+        return entry["response"]
+
+    def put(self, model, options, prompt, response):
+        """Store a response, then evict old entries if the cache is over budget"""
+        if self.bypass:
+            return
+
+        key = cache_key(model, options, prompt)
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        entry = {"model": model, "options": options or {}, "created": time.time(), "response": response}
+
+        try:
+            replaced = path.stat().st_size
+        except OSError:
+            replaced = 0
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False)
+        size = tmp_path.stat().st_size
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            self._writes += 1
+            if self._size is not None:
+                self._size += size - replaced
+            sweep = (
+                self._size is None
+                or self._writes % SWEEP_EVERY == 0
+                or (self.max_bytes and self._size > self.max_bytes)
+            )
+        if sweep:
+            self.evict()
+
+    def evict(self):
+        """Drop expired entries, then least recently used ones until comfortably under max_bytes"""
+        if not self.cache_dir.exists():
+            return
+
+        now = time.time()
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*/*.json"):
+            try:
+                stat = path.stat()
+            except OSError:
+                continue
+            if self.max_age and now - stat.st_mtime > self.max_age:
+                self._remove(path)
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        if self.max_bytes and total > self.max_bytes:
+            # Go a little below the budget so the next writes do not trigger another scan
+            target = self.max_bytes * 0.9
+            entries.sort()
+            for _, size, path in entries:
+                if total <= target:
+                    break
+                self._remove(path)
+                total -= size
+
+        with self._lock:
+            self._size = total
+
+    def _remove(self, path):
+        try:
+            path.unlink()
+        except OSError:
+            return
+        with self._lock:
+            self.evictions += 1
+
+    def clear(self):
+        """Remove every cached entry"""
+        for path in self.cache_dir.glob("*/*.json"):
+            self._remove(path)
+        with self._lock:
+            self._size = 0
+
+    def stats(self):
+        """Return hit/miss/eviction counters"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Return the shared cache configured from LLM_CACHE_DIR / LLM_CACHE_BYPASS"""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = LLMCache(
+                cache_dir=os.environ.get("LLM_CACHE_DIR"),
+                max_bytes=int(os.environ.get("LLM_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+                max_age=int(os.environ.get("LLM_CACHE_MAX_AGE", DEFAULT_MAX_AGE)),
+                bypass=os.environ.get("LLM_CACHE_BYPASS", "").lower() in ("1", "true", "yes"),
+            )
+        return _default_cache
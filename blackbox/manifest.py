@@ -0,0 +1,106 @@
+import hashlib
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+MANIFEST_VERSION = 1
+
+
+def content_hash(*parts):
+    """Stable sha256 of JSON-serializable parts"""
+    material = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def catalog_version(*catalogs):
+    """Short version string identifying the UI/API catalogs a result was produced against"""
+    return content_hash(*catalogs)[:16]
+
+
+def scenario_keys(names):
+    """Manifest keys for a list of scenario names; repeated names get '#2', '#3', ..."""
+    seen = {}
+    keys = []
+    for name in names:
+        seen[name] = seen.get(name, 0) + 1
+        keys.append(name if seen[name] == 1 else f"{name}#{seen[name]}")
+    return keys
+
+
+def manifest_path_for(output_path):
+    """Default manifest location: next to the artifact it describes"""
+    output_path = Path(output_path)
+    return output_path.with_name(output_path.name + ".manifest.json")
+
+
+class Manifest:
+    """Per-scenario record of input hashes and the outputs they produced
+
+    A result is reused when both the scenario's content hash and the catalog
+    version match what was recorded. save() keeps only the entries looked up
+    or recorded during this run, so deleted scenarios drop out.
+    """
+
+    def __init__(self, path, catalog=None, bypass=None):
+        self.path = Path(path)
+        self.catalog = catalog
+        if bypass is None:
+            bypass = os.environ.get("MANIFEST_BYPASS", "").lower() in ("1", "true", "yes")
+        self.bypass = bypass
+        self.entries = self._load()
+        self.used = {}
+        self.reused = 0
+        self.regenerated = 0
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+        if data.get("version") != MANIFEST_VERSION:
+            return {}
+        return data.get("entries", {})
+
+    def lookup(self, key, content):
+        """Return the recorded output for key if its content and catalog are unchanged, else None"""
+        entry = self.entries.get(key)
+        digest = content_hash(content)
+        with self._lock:
+            if (
+                not self.bypass
+                and entry is not None
+                and entry["hash"] == digest
+                and entry["catalog"] == self.catalog
+            ):
+                self.used[key] = entry
+                self.reused += 1
+                return entry["output"]
+            self.regenerated += 1
+        return None
+
+    def record(self, key, content, output):
+        """Remember the output produced for key from content"""
+        with self._lock:
+            self.used[key] = {
+                "hash": content_hash(content),
+                "catalog": self.catalog,
+                "output": output,
+                "updated": time.time(),
+            }
+
+    def save(self):
+        """Write the entries of this run atomically"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        data = {"version": MANIFEST_VERSION, "entries": self.used}
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, self.path)
+        self.entries = dict(self.used)
+
+    def summary(self):
+        return f"{self.reused} reused, {self.regenerated} regenerated"
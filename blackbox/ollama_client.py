@@ -0,0 +1,244 @@
+import http.client
+import json
+import os
+import queue
+import threading
+from urllib.parse import urlparse
+
+from blackbox.llm_cache import get_cache
+
+DEFAULT_HOST = "http://localhost:11434"
+DEFAULT_MODEL = "mistral"
+
+
+class OllamaError(Exception):
+    """Raised when the Ollama server cannot be reached or returns an error"""
+
+
+class OllamaClient:
+    """Ollama HTTP API client backed by a pool of keep-alive connections"""
+
+    def __init__(self, host=None, pool_size=4, timeout=600):
+        host = host or os.environ.get("OLLAMA_HOST", DEFAULT_HOST)
+        if "://" not in host:
+            host = f"http://{host}"
+        parsed = urlparse(host)
+        self.scheme = parsed.scheme
+        self.hostname = parsed.hostname or "localhost"
+        self.port = parsed.port or (443 if parsed.scheme == "https" else 11434)
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+
+    def _new_connection(self):
+        conn_class = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return conn_class(self.hostname, self.port, timeout=self.timeout)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._new_connection()
+
+    def _release(self, conn):
+        if self._idle.qsize() < self.pool_size:
+            self._idle.put(conn)
+        else:
+            conn.close()
+
+    def _set_timeout(self, conn, timeout):
+        conn.timeout = timeout
+        if conn.sock is not None:
+            conn.sock.settimeout(timeout)
+
+    def _open(self, path, payload, timeout=None):
+        """POST a JSON payload and return (connection, response), retrying once on a stale pooled connection"""
+        body = json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+
+        for attempt in range(2):
+            conn = self._acquire()
+            self._set_timeout(conn, timeout if timeout is not None else self.timeout)
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                response = conn.getresponse()
+            except (http.client.HTTPException, ConnectionError) as e:
+                conn.close()
+                if attempt == 0:
+                    continue
+                raise OllamaError(f"Connection to Ollama failed: {e}") from e
+            except TimeoutError:
+                conn.close()
+                raise
+            except OSError as e:
+                conn.close()
+                raise OllamaError(f"Connection to Ollama failed: {e}") from e
+
+            if response.status != 200:
+                data = response.read()
+                self._release(conn)
+                raise OllamaError(f"Ollama returned HTTP {response.status}: {data.decode('utf-8', 'replace')}")
+            return conn, response
+
+    def _post(self, path, payload, timeout=None):
+        """POST a JSON payload and return the decoded JSON body"""
+        conn, response = self._open(path, payload, timeout=timeout)
+        try:
+            data = response.read()
+        except (http.client.HTTPException, OSError) as e:
+            conn.close()
+            raise OllamaError(f"Connection to Ollama failed: {e}") from e
+        self._set_timeout(conn, self.timeout)
+        self._release(conn)
+
+        try:
+            return json.loads(data)
+        except json.JSONDecodeError as e:
+            raise OllamaError(f"Invalid JSON from Ollama: {e}") from e
+
+    def generate(self, prompt, model=DEFAULT_MODEL, options=None, timeout=None, context=None, on_done=None):
+        """Run a single non-streaming completion and return the generated text
+
+        context is the token array of an earlier answer, which continues that
+        exchange without resending it; on_done receives the final response
+        object, whose "context" can be passed to the next call.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": False}
+        if options:
+            payload["options"] = options
+        if context:
+            payload["context"] = context
+
+        result = self._post("/api/generate", payload, timeout=timeout)
+        if "error" in result:
+            raise OllamaError(result["error"])
+        if on_done is not None:
+            on_done(result)
+        return result.get("response", "")
+
+    def stream(self, prompt, model=DEFAULT_MODEL, options=None, timeout=None, context=None, on_done=None):
+        """Yield completion text chunks as the model produces them
+
+        Closing the generator early drops the connection, which makes Ollama
+        stop generating for this request. context and on_done work as in
+        generate; on_done is only called when the answer is complete.
+        """
+        payload = {"model": model, "prompt": prompt, "stream": True}
+        if options:
+            payload["options"] = options
+        if context:
+            payload["context"] = context
+
+        conn, response = self._open("/api/generate", payload, timeout=timeout)
+        finished = False
+        try:
+            for line in response:
+                if not line.strip():
+                    continue
+                try:
+                    data = json.loads(line)
+                except json.JSONDecodeError as e:
+                    raise OllamaError(f"Invalid JSON from Ollama: {e}") from e
+                if "error" in data:
+                    raise OllamaError(data["error"])
+                if data.get("response"):
+                    yield data["response"]
+                if data.get("done"):
+                    finished = True
+                    if on_done is not None:
+                        on_done(data)
+                    break
+        except (http.client.HTTPException, ConnectionError) as e:
+            raise OllamaError(f"Connection to Ollama failed: {e}") from e
+        finally:
+            if finished:
+                response.read()
+                self._set_timeout(conn, self.timeout)
+                self._release(conn)
+            else:
+                conn.close()
+
+    def close(self):
+        """Close every idle pooled connection"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    """Return the process-wide shared client, creating it on first use"""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = OllamaClient(pool_size=int(os.environ.get("OLLAMA_POOL_SIZE", "8")))
+        return _default_client
+
+
+def generate(prompt, model=DEFAULT_MODEL, options=None, timeout=None, use_cache=True, context=None, on_done=None):
+    """Generate a completion through the shared pooled client and response cache
+
+    A call continuing a context never uses the cache, and on_done is not
+    called for a cached answer (it has no context to continue from).
+    """
+    cache = get_cache() if use_cache and not context else None
+    if cache is not None:
+        cached = cache.get(model, options, prompt)
+        if cached is not None:
+            return cached
+
+    response = get_client().generate(prompt, model=model, options=options, timeout=timeout, context=context, on_done=on_done)
+    if cache is not None:
+        cache.put(model, options, prompt, response)
+    return response
+
+
+def stream(prompt, model=DEFAULT_MODEL, options=None, timeout=None, stop_when=None, use_cache=True, context=None,
+           on_done=None):
+    """Yield completion chunks as they arrive through the shared client
+
+    stop_when(text_so_far) is checked whenever a chunk completes a line; once
+    it returns True generation is cancelled. Only complete answers are cached.
+    context and on_done work as in generate.
+    """
+    cache = get_cache() if use_cache and not context else None
+    if cache is not None:
+        cached = cache.get(model, options, prompt)
+        if cached is not None:
+            yield cached
+            return
+
+    parts = []
+    chunks = get_client().stream(prompt, model=model, options=options, timeout=timeout, context=context, on_done=on_done)
+    try:
+        for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+            if stop_when is not None and "\n" in chunk and stop_when("".join(parts)):
+                return
+    finally:
+        chunks.close()
+
+    if cache is not None:
+        cache.put(model, options, prompt, "".join(parts))
+
+
+def stream_to_file(prompt, output_file, model=DEFAULT_MODEL, options=None, timeout=None, stop_when=None, use_cache=True):
+    """Stream a completion into output_file as it is generated and return the full text"""
+    parts = []
+    with open(output_file, "w", encoding="utf-8") as f:
+        for chunk in stream(prompt, model=model, options=options, timeout=timeout, stop_when=stop_when, use_cache=use_cache):
+            parts.append(chunk)
+            f.write(chunk)
+            f.flush()
+    return "".join(parts)
+
+
+def code_fence_closed(text):
+    """Stop condition: a fenced code block has been opened and closed"""
+    return text.count("```") >= 2
@@ -0,0 +1,91 @@
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+import fitz  # PyMuPDF
+
+PAGE_CACHE_DIR = Path(os.environ.get("PDF_CACHE_DIR", Path(__file__).resolve().parent.parent / ".pdf_cache"))
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", os.cpu_count() or 1))
+# Below this many uncached pages a process pool costs more than it saves
+MIN_PAGES_PER_WORKER = 8
+
+
+def pdf_file_hash(pdf_path):
+    """sha256 of the PDF bytes, so the page cache follows content rather than file name."""
+    digest = hashlib.sha256()
+    with open(pdf_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _page_cache_path(file_hash, page_number):
+    return PAGE_CACHE_DIR / file_hash / f"{page_number:05d}.txt"
+
+
+def _read_cached_page(file_hash, page_number):
+    try:
+        with open(_page_cache_path(file_hash, page_number), "r", encoding="utf-8") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+def _write_cached_page(file_hash, page_number, text):
+    path = _page_cache_path(file_hash, page_number)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _extract_pages(pdf_path, page_numbers):
+    """Worker: open the PDF in this process and extract the given pages."""
+    with fitz.open(pdf_path) as doc:
+        return [doc[page_number].get_text() for page_number in page_numbers]
+
+
+def iter_pdf_pages(pdf_path, workers=None, use_cache=True):
+    """Yield (page_number, text) for every page, in order, as soon as each page is available.
+
+    Cached pages (keyed by file hash + page number) are read back directly;
+    the rest are extracted across a process pool in contiguous page ranges.
+    """
+    workers = PDF_WORKERS if workers is None else workers
+    file_hash = pdf_file_hash(pdf_path) if use_cache else None
+    with fitz.open(pdf_path) as doc:
+        page_count = doc.page_count
+
+    cached = {}
+    if use_cache:
+        for page_number in range(page_count):
+            text = _read_cached_page(file_hash, page_number)
+            if text is not None:
+                cached[page_number] = text
+    missing = [page_number for page_number in range(page_count) if page_number not in cached]
+
+    workers = max(1, min(workers, len(missing) // MIN_PAGES_PER_WORKER))
+    chunk_size = max(1, -(-len(missing) // (workers * 4)))
+    chunks = [missing[i:i + chunk_size] for i in range(0, len(missing), chunk_size)]
+    chunk_at = {chunk[0]: chunk for chunk in chunks}
+
+    executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 and len(chunks) > 1 else None
+    try:
+        futures = {}
+        if executor is not None:
+            futures = {chunk[0]: executor.submit(_extract_pages, pdf_path, chunk) for chunk in chunks}
+        for page_number in range(page_count):
+            if page_number not in cached:
+                # Pages are visited in order, so an unfilled page always starts its chunk
+                chunk = chunk_at[page_number]
+                texts = futures[page_number].result() if futures else _extract_pages(pdf_path, chunk)
+                for chunk_page, text in zip(chunk, texts):
+                    if use_cache:
+                        _write_cached_page(file_hash, chunk_page, text)
+                    cached[chunk_page] = text
+            yield page_number, cached[page_number]
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
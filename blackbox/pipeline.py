@@ -0,0 +1,196 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+
+from blackbox.manifest import content_hash
+
+
+def file_hash(path):
+    """sha256 of a file's bytes, or None if it does not exist"""
+    digest = hashlib.sha256()
+    try:
+        with open(path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+def json_hash(path, ignore):
+    """sha256 of a JSON file's data without the dotted keys in ignore, or its file_hash if it is not JSON"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return file_hash(path)
+    for dotted in ignore:
+        *parents, key = dotted.split(".")
+        node = data
+        for parent in parents:
+            node = node.get(parent) if isinstance(node, dict) else None
+        if isinstance(node, dict):
+            node.pop(key, None)
+    return content_hash(data)
+
+
+class Stage:
+    """One pipeline step: run(stage) reads inputs and writes outputs, returning a truthy value on success
+
+    params are extra settings that should invalidate the stage when they
+    change (model name, batch size, ...). ignore lists dotted JSON keys of
+    the outputs (timestamps, ...) that do not count as a change.
+    """
+
+    def __init__(self, name, run, inputs=(), outputs=(), params=None, ignore=()):
+        self.name = name
+        self.run = run
+        self.inputs = [Path(path) for path in inputs]
+        self.outputs = [Path(path) for path in outputs]
+        self.params = params or {}
+        self.ignore = list(ignore)
+
+
+class Pipeline:
+    """Run stages in dependency order, in parallel where possible, skipping unchanged ones
+
+    A stage depends on every stage producing one of its inputs. It is skipped
+    when the hash of its inputs and params matches the previous run and its
+    outputs are still the files that run produced. Stages run on worker
+    threads but only the main thread reads or writes the saved state.
+    """
+
+    def __init__(self, stages, state_path, workers=4, force=False):
+        self.stages = {stage.name: stage for stage in stages}
+        self.state_path = Path(state_path)
+        self.workers = workers
+        self.force = force
+        self.state = self._load_state()
+        self.results = {}
+
+        producers = {path.resolve(): stage.name for stage in stages for path in stage.outputs}
+        self.ignored = {path.resolve(): stage.ignore for stage in stages for path in stage.outputs if stage.ignore}
+        self.dependencies = {
+            stage.name: {
+                producers[path.resolve()]
+                for path in stage.inputs
+                if path.resolve() in producers and producers[path.resolve()] != stage.name
+            }
+            for stage in stages
+        }
+
+    def _load_state(self):
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return {}
+
+    def _save_state(self):
+        self.state_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.state_path.with_suffix(f".{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=1)
+        os.replace(tmp_path, self.state_path)
+
+    def _path_hash(self, path):
+        ignore = self.ignored.get(path.resolve())
+        return json_hash(path, ignore) if ignore else file_hash(path)
+
+    def _input_hash(self, stage):
+        return content_hash(
+            stage.name,
+            stage.params,
+            [[str(path), self._path_hash(path)] for path in stage.inputs],
+        )
+
+    def _is_fresh(self, stage, input_hash, recorded):
+        if self.force:
+            return False
+        if not recorded or recorded["inputs"] != input_hash:
+            return False
+        return all(self._path_hash(path) == recorded["outputs"].get(str(path)) for path in stage.outputs)
+
+    def _run_stage(self, stage, recorded):
+        """Run or skip one stage given its recorded state; returns (status, seconds, new state or None)"""
+        start = time.perf_counter()
+        input_hash = self._input_hash(stage)
+        if self._is_fresh(stage, input_hash, recorded):
+            return "skipped", time.perf_counter() - start, None
+
+        missing = [str(path) for path in stage.inputs if not path.exists()]
+        if missing:
+            print(f"❌ {stage.name}: missing input(s) {', '.join(missing)}")
+            return "failed", time.perf_counter() - start, None
+
+        print(f"▶️ {stage.name}")
+        for path in stage.outputs:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            ok = stage.run(stage)
+        except Exception as e:
+            print(f"❌ {stage.name}: {e}")
+            ok = False
+        elapsed = time.perf_counter() - start
+
+        if not ok or not all(path.exists() for path in stage.outputs):
+            return "failed", elapsed, None
+        return "ran", elapsed, {
+            "inputs": input_hash,
+            "outputs": {str(path): self._path_hash(path) for path in stage.outputs},
+        }
+
+    def run(self, targets=None):
+        """Run the stages needed for targets (default: all); returns True if none failed"""
+        wanted = set(targets or self.stages)
+        pending = list(wanted)
+        while pending:
+            for dependency in self.dependencies[pending.pop()]:
+                if dependency not in wanted:
+                    wanted.add(dependency)
+                    pending.append(dependency)
+
+        start = time.perf_counter()
+        remaining = {name: set(self.dependencies[name]) & wanted for name in wanted}
+        running = {}
+        with ThreadPoolExecutor(max_workers=max(1, self.workers)) as executor:
+            while remaining or running:
+                for name in [name for name, deps in remaining.items() if not deps]:
+                    del remaining[name]
+                    running[executor.submit(self._run_stage, self.stages[name], self.state.get(name))] = name
+
+                if not running:
+                    # Everything left waits on a failed stage
+                    for name in remaining:
+                        self.results[name] = ("blocked", 0.0)
+                    break
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    status, elapsed, recorded = future.result()
+                    self.results[name] = (status, elapsed)
+                    if recorded is not None:
+                        self.state[name] = recorded
+                        self._save_state()
+                    if status == "failed":
+                        continue
+                    for deps in remaining.values():
+                        deps.discard(name)
+
+        self.print_summary(time.perf_counter() - start)
+        return not any(status in ("failed", "blocked") for status, _ in self.results.values())
+
+    def print_summary(self, total):
+        print("\n" + "=" * 60)
+        print("⏱️ PIPELINE SUMMARY")
+        print("=" * 60)
+        icons = {"ran": "✅", "skipped": "⏭️", "failed": "❌", "blocked": "⛔"}
+        for name in self.stages:
+            if name in self.results:
+                status, elapsed = self.results[name]
+                print(f"{icons[status]} {name:<22} {status:<8} {elapsed:8.2f}s")
+        print(f"Total wall time: {total:.2f}s")
@@ -0,0 +1,36 @@
+import math
+import os
+
+# Model context window and the share of it kept free for the answer
+CONTEXT_TOKENS = int(os.environ.get("LLM_CONTEXT_TOKENS", "8192"))
+OUTPUT_TOKENS = int(os.environ.get("LLM_OUTPUT_TOKENS", "3072"))
+PROMPT_TOKEN_BUDGET = CONTEXT_TOKENS - OUTPUT_TOKENS
+
+# Conservative characters-per-token ratio for English mixed with JSON and selectors
+CHARS_PER_TOKEN = 3
+
+
+def estimate_tokens(text):
+    """Rough token count of a prompt, erring on the high side"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def pack_by_budget(items, costs, budget):
+    """Greedily pack consecutive items into groups whose total cost fits the budget
+
+    An item that exceeds the budget on its own gets a group to itself; item
+    order is preserved.
+    """
+    groups = []
+    current = []
+    current_cost = 0
+    for item, cost in zip(items, costs):
+        if current and current_cost + cost > budget:
+            groups.append(current)
+            current = []
+            current_cost = 0
+        current.append(item)
+        current_cost += cost
+    if current:
+        groups.append(current)
+    return groups
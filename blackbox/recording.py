@@ -0,0 +1,145 @@
+import re
+
+from blackbox.gherkin import STEP_KEYWORDS
+
+# Steps as the browser recorder writes them (deep/*.feature)
+ENTER_STEP = re.compile(r'^(\s*)(\w+) I enter "(.*)" into the "(.*)"\s*$')
+CLICK_STEP = re.compile(r'^(\s*)(\w+) I click the "(.*)"\s*$')
+SEE_STEP = re.compile(r'^(\s*)(\w+) I should see "(.*)"\s*$')
+SCENARIO_LINE = re.compile(r'^\s*(Scenario|Scenario Outline|Scenario Template|Example|Background|Rule|Feature):')
+# Header the browser recorder writes at the top of every feature
+RECORDED_HEADER = re.compile(r'^\s*Feature: User flows recorded on ', re.MULTILINE)
+
+# Clicks on the page itself never do anything
+NOOP_TARGETS = frozenset(("html", "body"))
+# A page text needs this many characters in common with another one to serve as its baseline
+MIN_SHARED_CHARS = 8
+
+
+def _common_prefix(a, b):
+    size = 0
+    for x, y in zip(a, b):
+        if x != y:
+            break
+        size += 1
+    return size
+
+
+def changed_text(text, baselines):
+    """The part of a full-page text that differs from the closest baseline page text, or None
+
+    The closest baseline is the one sharing the longest prefix plus suffix;
+    what lies between them is the text that appeared, widened to whole
+    words. None when no baseline shares enough or nothing is left once
+    they are removed.
+    """
+    best = None
+    for baseline in baselines:
+        if baseline == text:
+            continue
+        prefix = _common_prefix(text, baseline)
+        limit = min(len(text), len(baseline)) - prefix
+        suffix = min(_common_prefix(text[::-1], baseline[::-1]), limit)
+        if best is None or prefix + suffix > best[0] + best[1]:
+            best = (prefix, suffix)
+
+    if best is None or sum(best) < MIN_SHARED_CHARS:
+        return None
+    prefix, suffix = best
+    start, end = prefix, len(text) - suffix
+    # Never cut a word in two
+    while start > 0 and not text[start - 1].isspace():
+        start -= 1
+    while end < len(text) and not text[end].isspace():
+        end += 1
+    changed = text[start:end].strip()
+    return changed or None
+
+
+def is_recorded_feature(feature_content):
+    """Whether a feature is browser recorder output: its header, or clicks on the page itself"""
+    if RECORDED_HEADER.search(feature_content):
+        return True
+    return any(
+        click.group(3).lower() in NOOP_TARGETS
+        for click in map(CLICK_STEP.match, feature_content.split("\n")) if click
+    )
+
+
+def _is_step(line):
+    return line.strip().split(" ", 1)[0] in STEP_KEYWORDS
+
+
+def _compact_steps(lines, page_texts, stats):
+    """Compact the step lines of one scenario (page_texts=None leaves assertions alone)"""
+    kept = []
+    filled = {}         # field -> position in kept of its latest fill since the last real action
+
+    for line in lines:
+        enter = ENTER_STEP.match(line)
+        click = CLICK_STEP.match(line)
+        see = SEE_STEP.match(line)
+
+        if enter:
+            field = enter.group(4)
+            if field in filled:
+                # Only the last value typed into a field before the next action matters
+                kept[filled[field]] = None
+                stats["fills_collapsed"] += 1
+            filled[field] = len(kept)
+        elif click:
+            target = click.group(3)
+            # A click on a field just filled (before any other action) only focuses it
+            if target.lower() in NOOP_TARGETS or target in filled:
+                stats["clicks_dropped"] += 1
+                continue
+            filled = {}
+        elif see and page_texts is not None:
+            changed = changed_text(see.group(3), page_texts)
+            if changed is not None and changed != see.group(3):
+                line = f'{see.group(1)}{see.group(2)} I should see "{changed}"'
+                stats["assertions_shrunk"] += 1
+            filled = {}
+        elif line.strip() and not line.strip().startswith(("#", "|", "@")):
+            filled = {}
+        kept.append(line)
+
+    return [line for line in kept if line is not None]
+
+
+def compact_recorded_feature(feature_content, shrink_texts=None):
+    """Remove recorder noise from a feature; returns (compacted text, stats)
+
+    Drops clicks on the page itself and focus clicks on a field filled since
+    the last real action, and keeps only the last of several fills of a field
+    before the next action. With shrink_texts (by default: only when
+    is_recorded_feature), full-page "I should see" texts also shrink to the
+    words that differ from the closest other page text in the feature.
+    Steps written in any other form are left untouched.
+    """
+    if shrink_texts is None:
+        shrink_texts = is_recorded_feature(feature_content)
+    lines = feature_content.split("\n")
+    page_texts = None
+    if shrink_texts:
+        page_texts = sorted({see.group(3) for see in map(SEE_STEP.match, lines) if see})
+    stats = {"steps_before": 0, "steps_after": 0, "clicks_dropped": 0, "fills_collapsed": 0, "assertions_shrunk": 0}
+
+    output = []
+    block = []
+
+    def flush():
+        compacted = _compact_steps(block, page_texts, stats)
+        stats["steps_before"] += sum(map(_is_step, block))
+        stats["steps_after"] += sum(map(_is_step, compacted))
+        output.extend(compacted)
+        block.clear()
+
+    for line in lines:
+        if SCENARIO_LINE.match(line):
+            flush()
+            output.append(line)
+        else:
+            block.append(line)
+    flush()
+    return "\n".join(output), stats
@@ -0,0 +1,138 @@
+import json
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+
+from blackbox.documents import split_document_sections
+from blackbox.manifest import content_hash
+
+DEFAULT_INDEX_DIR = Path(__file__).resolve().parent.parent / ".retrieval_index"
+CHUNK_CHARS = int(os.environ.get("RETRIEVAL_CHUNK_CHARS", "800"))
+TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "6"))
+
+STOPWORDS = frozenset(
+    "a an and are as at be by can for from has have if in is it its of on or "
+    "that the this to was will with de la le les des et en un une".split()
+)
+
+
+def tokenize(text):
+    """Lowercased word tokens without stopwords"""
+    return [token for token in re.findall(r"\w+", text.lower()) if token not in STOPWORDS]
+
+
+class BM25Index:
+    """Okapi BM25 over a list of text chunks"""
+
+    def __init__(self, chunks, k1=1.5, b=0.75, term_freqs=None):
+        self.chunks = chunks
+        self.k1 = k1
+        self.b = b
+        if term_freqs is None:
+            term_freqs = [Counter(tokenize(chunk)) for chunk in chunks]
+        self.term_freqs = term_freqs
+        self.lengths = [sum(freqs.values()) for freqs in self.term_freqs]
+        self.avg_length = sum(self.lengths) / len(chunks) if chunks else 0.0
+        doc_freqs = Counter(term for freqs in self.term_freqs for term in freqs)
+        total = len(chunks)
+        self.idf = {
+            term: math.log(1 + (total - freq + 0.5) / (freq + 0.5))
+            for term, freq in doc_freqs.items()
+        }
+        # term -> [(chunk position, term frequency)] so scoring touches only matching chunks
+        self.postings = {}
+        for position, freqs in enumerate(self.term_freqs):
+            for term, freq in freqs.items():
+                self.postings.setdefault(term, []).append((position, freq))
+
+    def search(self, query, top_k=None):
+        """Return (chunk position, score) pairs, best first"""
+        scores = {}
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for position, freq in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[position] / (self.avg_length or 1))
+                scores[position] = scores.get(position, 0.0) + idf * freq * (self.k1 + 1) / (freq + norm)
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:top_k] if top_k is not None else ranked
+
+    def context(self, query, top_k=TOP_K, exclude=None, max_chars=None):
+        """The top_k chunks for query, joined in document order, skipping chunks contained in exclude
+
+        When the top_k chunks already include every chunk of exclude, only the
+        rest of those top_k are kept; otherwise the best top_k outside exclude.
+        With max_chars, lower-ranked chunks are left out until the result fits.
+        """
+        ranked = [position for position, _ in self.search(query)]
+        if exclude:
+            own = {position for position, chunk in enumerate(self.chunks) if chunk in exclude}
+            if own and own <= set(ranked[:top_k]):
+                ranked = ranked[:top_k]
+            ranked = [position for position in ranked if position not in own]
+        chosen, size = [], 0
+        for position in ranked[:top_k]:
+            cost = len(self.chunks[position]) + (2 if chosen else 0)
+            if max_chars is not None and size + cost > max_chars:
+                continue
+            chosen.append(position)
+            size += cost
+        return "\n\n".join(self.chunks[position] for position in sorted(chosen))
+
+    def to_dict(self):
+        return {"chunks": self.chunks, "k1": self.k1, "b": self.b, "term_freqs": self.term_freqs}
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data["chunks"], k1=data["k1"], b=data["b"], term_freqs=data["term_freqs"])
+
+
+_indexes = {}
+_indexes_lock = threading.Lock()
+
+
+def load_index(doc_text, chunk_chars=None, index_dir=None):
+    """BM25 index over the document's chunks, built once per document and persisted on disk"""
+    chunk_chars = chunk_chars or CHUNK_CHARS
+    key = content_hash(doc_text, chunk_chars)
+    with _indexes_lock:
+        if key in _indexes:
+            return _indexes[key]
+
+        path = Path(index_dir or os.environ.get("RETRIEVAL_INDEX_DIR") or DEFAULT_INDEX_DIR) / f"{key}.json"
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                index = BM25Index.from_dict(json.load(f))
+        except (OSError, json.JSONDecodeError, KeyError):
+            chunks = [section["text"] for section in split_document_sections(doc_text, chunk_chars)]
+            index = BM25Index(chunks)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(index.to_dict(), f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+
+        _indexes[key] = index
+        return index
+
+
+def relevant_context(doc_text, query, top_k=None, chunk_chars=None, exclude=None, max_chars=None):
+    """Only the chunks of doc_text relevant to query, or the whole text when it already fits
+
+    With exclude (text the prompt already carries, such as a section) only
+    chunks found elsewhere in the document are returned, possibly none, and
+    at most max_chars of them.
+    """
+    top_k = TOP_K if top_k is None else top_k
+    chunk_chars = chunk_chars or CHUNK_CHARS
+    if exclude is not None:
+        if not query or top_k <= 0 or (max_chars is not None and max_chars <= 0):
+            return ""
+        return load_index(doc_text, chunk_chars).context(query, top_k, exclude=exclude, max_chars=max_chars)
+    if not query or top_k <= 0 or len(doc_text) <= top_k * chunk_chars:
+        return doc_text
+    return load_index(doc_text, chunk_chars).context(query, top_k)
@@ -0,0 +1,103 @@
+import json
+import os
+import statistics
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+# Assumed duration of a test never timed before, when no other test has been either
+DEFAULT_DURATION = 1.0
+
+
+def load_durations(path):
+    """Per-test durations (seconds) recorded by earlier runs"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def save_durations(path, durations):
+    """Merge this run's durations into the file atomically"""
+    path = Path(path)
+    merged = load_durations(path)
+    merged.update(durations)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(merged, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def balance_shards(test_ids, durations, shards):
+    """Split tests into shards of similar total duration; returns [(test ids, predicted seconds)]
+
+    Longest tests are placed first, each on the currently lightest shard.
+    Tests without a recorded duration count as the median of the known
+    ones. Within a shard tests keep their collection order.
+    """
+    known = [durations[test_id] for test_id in test_ids if test_id in durations]
+    default = statistics.median(known) if known else DEFAULT_DURATION
+    cost = {test_id: durations.get(test_id, default) for test_id in test_ids}
+    order = {test_id: position for position, test_id in enumerate(test_ids)}
+
+    bins = [([], 0.0) for _ in range(max(1, min(shards, len(test_ids))))]
+    for test_id in sorted(test_ids, key=lambda test_id: (-cost[test_id], order[test_id])):
+        lightest = min(range(len(bins)), key=lambda i: (bins[i][1], i))
+        ids, total = bins[lightest]
+        bins[lightest] = (ids + [test_id], total + cost[test_id])
+    return [(sorted(ids, key=order.get), total) for ids, total in bins]
+
+
+def parse_junit(path):
+    """Test cases of a JUnit XML report as dicts: name, classname, file, outcome, duration, message"""
+    try:
+        root = ET.parse(path).getroot()
+    except (OSError, ET.ParseError):
+        return []
+
+    cases = []
+    for case in root.iter("testcase"):
+        outcome, message = "passed", ""
+        for tag in ("failure", "error", "skipped"):
+            element = case.find(tag)
+            if element is not None:
+                outcome = "skipped" if tag == "skipped" else "failed"
+                message = element.get("message") or (element.text or "").strip()
+                break
+        cases.append({
+            "name": case.get("name", ""),
+            "classname": case.get("classname", ""),
+            "file": case.get("file"),
+            "outcome": outcome,
+            "duration": float(case.get("time") or 0.0),
+            "message": message,
+        })
+    return cases
+
+
+def write_junit(path, results):
+    """Merged JUnit XML report with one <testsuite> per shard
+
+    results: [(shard name, cases as returned by parse_junit)]
+    """
+    suites = ET.Element("testsuites")
+    for name, cases in results:
+        suite = ET.SubElement(suites, "testsuite", {
+            "name": name,
+            "tests": str(len(cases)),
+            "failures": str(sum(case["outcome"] == "failed" for case in cases)),
+            "skipped": str(sum(case["outcome"] == "skipped" for case in cases)),
+            "time": f"{sum(case['duration'] for case in cases):.3f}",
+        })
+        for case in cases:
+            element = ET.SubElement(suite, "testcase", {
+                "name": case["name"],
+                "classname": case["classname"],
+                "time": f"{case['duration']:.3f}",
+            })
+            if case["outcome"] in ("failed", "skipped"):
+                tag = "failure" if case["outcome"] == "failed" else "skipped"
+                ET.SubElement(element, tag, {"message": case["message"][:500]})
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    ET.ElementTree(suites).write(path, encoding="utf-8", xml_declaration=True)
@@ -1,142 +1,385 @@
+import heapq
 import json
-import subprocess
+import os
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import numpy as np
+except ImportError:  # vectorized step mapping is optional
+    np = None
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.gherkin import iter_scenarios, iter_scenarios_from_text, split_feature_blocks
+from blackbox.manifest import Manifest, catalog_version, manifest_path_for, scenario_keys
+from blackbox.ollama_client import OllamaError, generate, stream
+from blackbox.prompting import CONTEXT_TOKENS, PROMPT_TOKEN_BUDGET, estimate_tokens, pack_by_budget
+
+def run_mistral(prompt, stop_when=None, use_cache=True, context=None, on_done=None):
+    """
+    Run a prompt through the shared Ollama client and return (output, error)
+    
+    When stop_when is given the answer is streamed and generation stops as
+    soon as stop_when(partial_output) returns True. Retries pass use_cache=False
+    so that they get a fresh answer instead of the one that needed retrying.
+    context continues an earlier answer whose final response was handed to on_done.
+    """
+    # Size the context window explicitly so long prompts are not silently truncated
+    options = {'num_ctx': CONTEXT_TOKENS}
+    try:
+        if stop_when is not None:
+            return "".join(stream(prompt, model='mistral', options=options, stop_when=stop_when, use_cache=use_cache,
+                                  context=context, on_done=on_done)), None
+        return generate(prompt, model='mistral', options=options, use_cache=use_cache, context=context, on_done=on_done), None
+    except OllamaError as e:
+        return None, str(e)
 
 def parse_gherkin_scenarios(feature_content):
     """
     Parse Gherkin scenarios into structured format
+    
+    feature_content is the feature text or a feature file opened in binary
+    mode, which is then parsed as it is read. Scenario Outlines, But/* steps
+    and tags are kept; Background steps are left out since the prompts
+    already carry the feature text they come from.
+    """
+    if isinstance(feature_content, str):
+        feature_content = iter_scenarios_from_text(feature_content)
+    else:
+        feature_content = iter_scenarios(feature_content)
+    return [
+        {
+            'name': scenario['name'],
+            'tags': scenario['tags'],
+            'line': scenario['line'],
+            'steps': [{'type': step['keyword'], 'text': step['text']} for step in scenario['steps']]
+        }
+        for scenario in feature_content
+    ]
+
+# Generic keywords that could appear in any application
+UI_ACTION_KEYWORDS = {
+    'click': ['button', 'link', 'submit'],
+    'type': ['input', 'text', 'field'],
+    'select': ['select', 'dropdown', 'option'],
+    'check': ['checkbox', 'check'],
+    'navigate': ['nav', 'menu', 'link'],
+    'fill': ['input', 'text', 'field', 'form'],
+    'enter': ['input', 'text', 'field'],
+    'choose': ['select', 'dropdown', 'radio'],
+    'provide': ['input', 'text', 'field'],
+    'submit': ['submit', 'button', 'form']
+}
+
+def element_match_text(element):
+    """
+    Text of an element that step words are matched against
+    """
+    return (str(element.get('text', '')) + ' ' + 
+            str(element.get('placeholder', '')) + ' ' + 
+            str(element.get('id', '')) + ' ' + 
+            str(element.get('selector', ''))).lower()
+
+class TrigramIndex:
+    """
+    Substring lookup over a list of texts for words of three or more characters
     """
-    scenarios = []
-    lines = feature_content.split('\n')
-    current_scenario = None
-    
-    for line in lines:
-        line = line.strip()
-        if line.startswith('Scenario:'):
-            if current_scenario:
-                scenarios.append(current_scenario)
-            current_scenario = {
-                'name': line.replace('Scenario:', '').strip(),
-                'steps': []
-            }
-        elif line.startswith(('Given ', 'When ', 'Then ', 'And ')):
-            if current_scenario:
-                step_type = line.split()[0]
-                step_text = line[len(step_type):].strip()
-                current_scenario['steps'].append({
-                    'type': step_type,
-                    'text': step_text
-                })
     
-    if current_scenario:
-        scenarios.append(current_scenario)
+    def __init__(self, texts):
+        self.texts = texts
+        self.trigrams = {}
+        for position, text in enumerate(texts):
+            for i in range(len(text) - 2):
+                self.trigrams.setdefault(text[i:i + 3], set()).add(position)
+        self._word_hits = {}
     
-    return scenarios
+    def word_hits(self, word):
+        """
+        Positions of the texts that contain word (memoized per word)
+        """
+        hits = self._word_hits.get(word)
+        if hits is None:
+            postings = [self.trigrams.get(word[i:i + 3], set()) for i in range(len(word) - 2)]
+            postings.sort(key=len)
+            candidates = set.intersection(*postings) if postings and postings[0] else set()
+            hits = {position for position in candidates if word in self.texts[position]}
+            self._word_hits[word] = hits
+        return hits
 
-def find_matching_ui_element(step_text, ui_elements):
+def rank_scores(scores, top_k=None):
     """
-    Find UI elements that might match this step based on keywords
+    Order (position, score) pairs best first, breaking ties by catalog position
     """
-    step_lower = step_text.lower()
-    
-    # Generic keywords that could appear in any application
-    action_keywords = {
-        'click': ['button', 'link', 'submit'],
-        'type': ['input', 'text', 'field'],
-        'select': ['select', 'dropdown', 'option'],
-        'check': ['checkbox', 'check'],
-        'navigate': ['nav', 'menu', 'link'],
-        'fill': ['input', 'text', 'field', 'form'],
-        'enter': ['input', 'text', 'field'],
-        'choose': ['select', 'dropdown', 'radio'],
-        'provide': ['input', 'text', 'field'],
-        'submit': ['submit', 'button', 'form']
-    }
-    
-    matches = []
-    for element in ui_elements:
-        element_data = str(element).lower()
-        
-        score = 0
-        # Check if step contains action words and element contains matching types
-        for action, element_types in action_keywords.items():
-            if action in step_lower:
-                for elem_type in element_types:
-                    if elem_type in element_data:
-                        score += 5
+    ranked = sorted(scores.items())
+    if top_k is None:
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked
+    return heapq.nlargest(top_k, ranked, key=lambda item: item[1])
+
+class UIElementIndex:
+    """
+    Inverted index over a UI element catalog, built once and reused for every step
+    
+    Step words score by substring containment, and only words longer than two
+    characters count, so a trigram index yields the exact candidate set. Action
+    keyword scores depend only on which element types appear in an element, so
+    elements are grouped by that signature and scored per group.
+    """
+    
+    def __init__(self, ui_elements):
+        self.ui_elements = ui_elements
+        self.text_index = TrigramIndex([element_match_text(element) for element in ui_elements])
+        
+        element_types = {t for types in UI_ACTION_KEYWORDS.values() for t in types}
+        self.signature_groups = {}
+        for position, element in enumerate(ui_elements):
+            element_data = str(element).lower()
+            signature = frozenset(t for t in element_types if t in element_data)
+            self.signature_groups.setdefault(signature, []).append(position)
+    
+    def search(self, step_text, top_k=None):
+        """
+        Score the candidate elements for a step; returns (element, score) pairs best first
+        """
+        step_lower = step_text.lower()
+        scores = {}
         
-        # Check for direct text matches in element properties
-        element_text = (str(element.get('text', '')) + ' ' + 
-                       str(element.get('placeholder', '')) + ' ' + 
-                       str(element.get('id', '')) + ' ' + 
-                       str(element.get('selector', ''))).lower()
+        # Check if step contains action words and element contains matching types
+        step_actions = [action for action in UI_ACTION_KEYWORDS if action in step_lower]
+        if step_actions:
+            for signature, positions in self.signature_groups.items():
+                action_score = sum(
+                    5 for action in step_actions
+                    for elem_type in UI_ACTION_KEYWORDS[action]
+                    if elem_type in signature
+                )
+                if action_score:
+                    for position in positions:
+                        scores[position] = action_score
         
-        # Split step into words and check for matches
-        step_words = re.findall(r'\b\w+\b', step_lower)
-        for word in step_words:
-            if len(word) > 2 and word in element_text:  # Ignore short words
-                score += 3
+        # Split step into words and check for matches, ignoring short words
+        for word in re.findall(r'\b\w+\b', step_lower):
+            if len(word) > 2:
+                for position in self.text_index.word_hits(word):
+                    scores[position] = scores.get(position, 0) + 3
         
-        if score > 0:
-            matches.append((element, score))
+        return [(self.ui_elements[position], score) for position, score in rank_scores(scores, top_k)]
+
+def find_matching_ui_element(step_text, ui_elements, index=None, top_k=None):
+    """
+    Find UI elements that might match this step based on keywords
     
-    # Return all matches sorted by score
-    return sorted(matches, key=lambda x: x[1], reverse=True)
+    Pass a prebuilt UIElementIndex to avoid re-indexing the catalog for every step.
+    """
+    if index is None:
+        index = UIElementIndex(ui_elements)
+    return index.search(step_text, top_k=top_k)
 
-def find_matching_api_endpoint(step_text, api_endpoints):
+# Generic HTTP action mapping
+HTTP_ACTIONS = {
+    'create': ['post'],
+    'add': ['post'],
+    'submit': ['post'],
+    'register': ['post'],
+    'login': ['post'],
+    'update': ['put', 'patch'],
+    'modify': ['put', 'patch'],
+    'change': ['put', 'patch'],
+    'delete': ['delete'],
+    'remove': ['delete'],
+    'get': ['get'],
+    'fetch': ['get'],
+    'retrieve': ['get'],
+    'view': ['get'],
+    'logout': ['post', 'delete']
+}
+
+class APIEndpointIndex:
     """
-    Find API endpoints that might be relevant for this step
+    Route index over an endpoint list, built once and reused for every step
+    
+    Endpoints are grouped by method for the verb -> method score. Step words are
+    runs of word characters, so a word occurs in a URL exactly when it occurs in
+    one of the URL's word tokens (host, port and path segment parts). Only the
+    distinct tokens are indexed, which stays small for HAR-sized lists.
     """
-    step_lower = step_text.lower()
-    
-    # Generic HTTP action mapping
-    http_actions = {
-        'create': ['post'],
-        'add': ['post'],
-        'submit': ['post'],
-        'register': ['post'],
-        'login': ['post'],
-        'update': ['put', 'patch'],
-        'modify': ['put', 'patch'],
-        'change': ['put', 'patch'],
-        'delete': ['delete'],
-        'remove': ['delete'],
-        'get': ['get'],
-        'fetch': ['get'],
-        'retrieve': ['get'],
-        'view': ['get'],
-        'logout': ['post', 'delete']
-    }
-    
-    matches = []
-    for endpoint in api_endpoints:
-        endpoint_data = str(endpoint).lower()
-        method = str(endpoint.get('method', '')).lower()
-        url = str(endpoint.get('url', '')).lower()
-        
-        score = 0
+    
+    def __init__(self, api_endpoints):
+        self.api_endpoints = api_endpoints
+        self.by_method = {}
+        tokens = {}
+        for position, endpoint in enumerate(api_endpoints):
+            method = str(endpoint.get('method', '')).lower()
+            self.by_method.setdefault(method, []).append(position)
+            url = str(endpoint.get('url', '')).lower()
+            for token in set(re.findall(r'\w+', url)):
+                tokens.setdefault(token, set()).add(position)
+        
+        self.tokens = list(tokens)
+        self.token_endpoints = [tokens[token] for token in self.tokens]
+        self.token_index = TrigramIndex(self.tokens)
+        self._word_endpoints = {}
+    
+    def word_endpoints(self, word):
+        """
+        Positions of endpoints whose URL contains word (memoized per word)
+        """
+        hits = self._word_endpoints.get(word)
+        if hits is None:
+            hits = set()
+            for token_position in self.token_index.word_hits(word):
+                hits |= self.token_endpoints[token_position]
+            self._word_endpoints[word] = hits
+        return hits
+    
+    def search(self, step_text, top_k=None):
+        """
+        Score the candidate endpoints for a step; returns (endpoint, score) pairs best first
+        """
+        step_lower = step_text.lower()
+        scores = {}
         
         # Check if step action matches HTTP method
-        for action, methods in http_actions.items():
-            if action in step_lower and method in methods:
-                score += 10
+        method_scores = {}
+        for action, methods in HTTP_ACTIONS.items():
+            if action in step_lower:
+                for method in methods:
+                    method_scores[method] = method_scores.get(method, 0) + 10
+        for method, method_score in method_scores.items():
+            for position in self.by_method.get(method, []):
+                scores[position] = method_score
         
         # Check for URL path matches with step words
-        step_words = re.findall(r'\b\w+\b', step_lower)
-        for word in step_words:
-            if len(word) > 2 and word in url:
-                score += 5
+        for word in re.findall(r'\b\w+\b', step_lower):
+            if len(word) > 2:
+                for position in self.word_endpoints(word):
+                    scores[position] = scores.get(position, 0) + 5
         
-        if score > 0:
-            matches.append((endpoint, score))
+        return [(self.api_endpoints[position], score) for position, score in rank_scores(scores, top_k)]
+
+def find_matching_api_endpoint(step_text, api_endpoints, index=None, top_k=None):
+    """
+    Find API endpoints that might be relevant for this step
     
-    return sorted(matches, key=lambda x: x[1], reverse=True)
+    Pass a prebuilt APIEndpointIndex to avoid re-indexing the endpoints for every step.
+    """
+    if index is None:
+        index = APIEndpointIndex(api_endpoints)
+    return index.search(step_text, top_k=top_k)
 
-def generate_step_mapping(scenarios, ui_elements, api_endpoints):
+def top_k_columns(scores, k):
+    """
+    Per row, the columns of the k best positive scores, best first
+    
+    Ties are broken by column order (the order the old stable sort produced) by
+    folding the column index into the partition key.
+    """
+    n_rows, n_cols = scores.shape
+    if n_cols == 0 or k <= 0:
+        return [[] for _ in range(n_rows)]
+    
+    k = min(k, n_cols)
+    keys = scores.astype(np.int64) * n_cols - np.arange(n_cols, dtype=np.int64)
+    candidates = np.argpartition(-keys, k - 1, axis=1)[:, :k]
+    rows = []
+    for row, columns in enumerate(candidates):
+        columns = columns[np.argsort(-keys[row, columns])]
+        rows.append([int(column) for column in columns if scores[row, column] > 0])
+    return rows
+
+def score_steps_vectorized(step_texts, ui_index, api_index, ui_top_k=3, api_top_k=2):
+    """
+    Score all steps against all UI elements and API endpoints at once with NumPy
+    
+    Builds steps x terms matrices for action keywords and step words and
+    multiplies them with the catalog term matrices, giving the same scores as
+    UIElementIndex.search / APIEndpointIndex.search. Returns the per-step top
+    (element, score) and (endpoint, score) lists.
+    """
+    steps_lower = [text.lower() for text in step_texts]
+    n_steps = len(steps_lower)
+    n_elements = len(ui_index.ui_elements)
+    n_endpoints = len(api_index.api_endpoints)
+    
+    # Step words (longer than two characters, repeats counted) -> steps x vocabulary counts
+    step_words = [[word for word in re.findall(r'\b\w+\b', text) if len(word) > 2] for text in steps_lower]
+    vocabulary = {}
+    for words in step_words:
+        for word in words:
+            vocabulary.setdefault(word, len(vocabulary))
+    word_counts = np.zeros((n_steps, len(vocabulary)))
+    for row, words in enumerate(step_words):
+        for word in words:
+            word_counts[row, vocabulary[word]] += 1
+    
+    # Vocabulary x catalog containment, from the substring indexes
+    element_hits = np.zeros((len(vocabulary), n_elements))
+    endpoint_hits = np.zeros((len(vocabulary), n_endpoints))
+    for word, column in vocabulary.items():
+        element_hits[column, list(ui_index.text_index.word_hits(word))] = 1
+        endpoint_hits[column, list(api_index.word_endpoints(word))] = 1
+    
+    # UI action keywords: steps x actions @ actions x element types @ element types x elements
+    ui_actions = list(UI_ACTION_KEYWORDS)
+    element_types = sorted({t for types in UI_ACTION_KEYWORDS.values() for t in types})
+    type_columns = {t: i for i, t in enumerate(element_types)}
+    step_ui_actions = np.array([[action in text for action in ui_actions] for text in steps_lower], dtype=float).reshape(n_steps, len(ui_actions))
+    action_types = np.zeros((len(ui_actions), len(element_types)))
+    for row, action in enumerate(ui_actions):
+        for elem_type in UI_ACTION_KEYWORDS[action]:
+            action_types[row, type_columns[elem_type]] += 1
+    element_signatures = np.zeros((len(element_types), n_elements))
+    for signature, positions in ui_index.signature_groups.items():
+        for elem_type in signature:
+            element_signatures[type_columns[elem_type], positions] = 1
+    
+    ui_scores = 5 * (step_ui_actions @ action_types) @ element_signatures + 3 * (word_counts @ element_hits)
+    
+    # HTTP verbs: steps x verbs @ verbs x endpoints (endpoint method is one of the verb's methods)
+    http_actions = list(HTTP_ACTIONS)
+    step_http_actions = np.array([[action in text for action in http_actions] for text in steps_lower], dtype=float).reshape(n_steps, len(http_actions))
+    verb_endpoints = np.zeros((len(http_actions), n_endpoints))
+    for row, action in enumerate(http_actions):
+        for method in HTTP_ACTIONS[action]:
+            verb_endpoints[row, api_index.by_method.get(method, [])] = 1
+    
+    api_scores = 10 * (step_http_actions @ verb_endpoints) + 5 * (word_counts @ endpoint_hits)
+    
+    # Scores are small integers, so the float products are exact
+    ui_scores = np.rint(ui_scores).astype(np.int64)
+    api_scores = np.rint(api_scores).astype(np.int64)
+    
+    ui_top = [
+        [(ui_index.ui_elements[column], int(ui_scores[row, column])) for column in columns]
+        for row, columns in enumerate(top_k_columns(ui_scores, ui_top_k))
+    ]
+    api_top = [
+        [(api_index.api_endpoints[column], int(api_scores[row, column])) for column in columns]
+        for row, columns in enumerate(top_k_columns(api_scores, api_top_k))
+    ]
+    return ui_top, api_top
+
+def generate_step_mapping(scenarios, ui_elements, api_endpoints, vectorized=None):
     """
     Generate mapping for each step in each scenario
+    
+    When NumPy is available (or vectorized=True) every step of the feature is
+    scored in one shot by score_steps_vectorized; otherwise steps are scored
+    one at a time against the catalog indexes. Both give the same mapping.
     """
+    if vectorized is None:
+        vectorized = np is not None
+    
     mappings = []
+    ui_index = UIElementIndex(ui_elements)
+    api_index = APIEndpointIndex(api_endpoints)
+    
+    if vectorized:
+        step_texts = [step['text'] for scenario in scenarios for step in scenario['steps']]
+        ui_top, api_top = score_steps_vectorized(step_texts, ui_index, api_index)
+        precomputed_matches = zip(ui_top, api_top)
     
     for scenario in scenarios:
         scenario_mapping = {
@@ -153,13 +396,15 @@ def generate_step_mapping(scenarios, ui_elements, api_endpoints):
                 'actions': []
             }
             
-            # Find matching UI elements
-            ui_matches = find_matching_ui_element(step['text'], ui_elements)
-            step_mapping['ui_elements'] = ui_matches[:3]  # Top 3 matches
+            if vectorized:
+                ui_matches, api_matches = next(precomputed_matches)
+            else:
+                # Find matching UI elements and API endpoints
+                ui_matches = find_matching_ui_element(step['text'], ui_elements, index=ui_index, top_k=3)
+                api_matches = find_matching_api_endpoint(step['text'], api_endpoints, index=api_index, top_k=2)
             
-            # Find matching API endpoints
-            api_matches = find_matching_api_endpoint(step['text'], api_endpoints)
-            step_mapping['api_endpoints'] = api_matches[:2]  # Top 2 matches
+            step_mapping['ui_elements'] = ui_matches  # Top 3 matches
+            step_mapping['api_endpoints'] = api_matches  # Top 2 matches
             
             # Determine actions based on step type and content
             step_mapping['actions'] = determine_actions(step)
@@ -211,6 +456,15 @@ def determine_actions(step):
     
     return actions
 
+def format_catalog_details(label, entries):
+    """
+    List every catalog entry with all of its fields ("Element 1:\n  - key: value\n...")
+    """
+    return "".join(
+        f"{label} {i+1}:\n" + "".join(f"  - {key}: {json.dumps(value)}\n" for key, value in entry.items()) + "\n"
+        for i, entry in enumerate(entries)
+    )
+
 def create_llm_enhanced_prompt(ui_elements_json, api_endpoints_json, feature_file_content):
     """
     Create a prompt that uses LLM to intelligently map each step with complete coverage
@@ -221,7 +475,7 @@ def create_llm_enhanced_prompt(ui_elements_json, api_endpoints_json, feature_fil
     total_scenarios = len(scenarios)
     total_steps = sum(len(scenario['steps']) for scenario in scenarios)
     
-    prompt = f"""You are an expert test automation engineer. Create COMPLETE step-by-step mapping for ALL {total_scenarios} scenarios with ALL {total_steps} steps.
+    header = f"""You are an expert test automation engineer. Create COMPLETE step-by-step mapping for ALL {total_scenarios} scenarios with ALL {total_steps} steps.
 
 ## CRITICAL SUCCESS CRITERIA:
 ✅ Must map ALL {total_scenarios} scenarios - zero missing
@@ -232,23 +486,7 @@ def create_llm_enhanced_prompt(ui_elements_json, api_endpoints_json, feature_fil
 ## AVAILABLE UI ELEMENTS (USE ONLY THESE):
 """
     
-    # List all UI elements with exact data
-    for i, element in enumerate(ui_elements_json):
-        prompt += f"Element {i+1}:\n"
-        for key, value in element.items():
-            prompt += f"  - {key}: {json.dumps(value)}\n"
-        prompt += "\n"
-    
-    prompt += "## AVAILABLE API ENDPOINTS (USE ONLY THESE):\n"
-    
-    # List all API endpoints with exact data
-    for i, endpoint in enumerate(api_endpoints_json):
-        prompt += f"Endpoint {i+1}:\n"
-        for key, value in endpoint.items():
-            prompt += f"  - {key}: {json.dumps(value)}\n"
-        prompt += "\n"
-    
-    prompt += f"""## ALL {total_scenarios} GHERKIN SCENARIOS TO MAP (COMPLETE COVERAGE REQUIRED):
+    footer = f"""## ALL {total_scenarios} GHERKIN SCENARIOS TO MAP (COMPLETE COVERAGE REQUIRED):
 {feature_file_content}
 
 ## ABSOLUTE REQUIREMENTS:
@@ -302,63 +540,182 @@ Before submitting, verify:
 ## PROCESS ALL SCENARIOS NOW:
 Generate complete mapping tables for EVERY scenario. Leave nothing out."""
 
-    return prompt
+    # List all UI elements and API endpoints with exact data
+    return "".join([
+        header,
+        format_catalog_details("Element", ui_elements_json),
+        "## AVAILABLE API ENDPOINTS (USE ONLY THESE):\n",
+        format_catalog_details("Endpoint", api_endpoints_json),
+        footer,
+    ])
+
+SCENARIO_HEADING = '### scenario:'
+STEP_ROW_KEYWORDS = ('given', 'when', 'then', 'and', 'but', '*')
+STEP_ROW_REGEX = re.compile(r'\| (Given|When|Then|And) ', re.IGNORECASE)
 
-def validate_scenario_completeness(llm_output, feature_content):
+class MappingLines:
     """
-    Validate that all scenarios and steps are included in the LLM output
+    Scenario headings and step table rows found in a set of complete lines (lowercased)
     """
-    # Parse original scenarios
-    original_scenarios = parse_gherkin_scenarios(feature_content)
     
-    issues = []
-    scenario_count_in_output = 0
-    step_count_in_output = 0
+    def __init__(self):
+        self.scenario_count = 0
+        self.step_count = 0
+        self.heading_names = set()  # stripped text after '### SCENARIO:'
+        self.headings = []          # raw text after '### SCENARIO:'
+        self.step_keys = set()      # (keyword, first 20 chars of the row's step text)
+        self.step_rows = {}         # keyword -> text following each '| keyword'
+    
+    def add_line(self, line):
+        lowered = line.lower()
+        
+        heading_at = lowered.find(SCENARIO_HEADING)
+        if heading_at != -1:
+            self.scenario_count += lowered.count(SCENARIO_HEADING)
+            heading = lowered[heading_at + len(SCENARIO_HEADING):]
+            self.headings.append(heading)
+            self.heading_names.add(heading.strip())
+        
+        if '| ' not in lowered:
+            return
+        self.step_count += len(STEP_ROW_REGEX.findall(line))
+        position = lowered.find('| ')
+        while position != -1:
+            rest = lowered[position + 2:]
+            for keyword in STEP_ROW_KEYWORDS:
+                if rest.startswith(keyword):
+                    remainder = rest[len(keyword):]
+                    self.step_rows.setdefault(keyword, []).append(remainder)
+                    self.step_keys.add((keyword, remainder.lstrip(' |\t')[:20]))
+            position = lowered.find('| ', position + 1)
+    
+    def has_scenario(self, name):
+        if name in self.heading_names:
+            return True
+        return any(name in heading for heading in self.headings)
+    
+    def has_step(self, keyword, prefix):
+        if (keyword, prefix) in self.step_keys:
+            return True
+        return any(prefix in remainder for remainder in self.step_rows.get(keyword, ()))
+
+class MappingCoverageIndex:
+    """
+    Incremental index of the '### SCENARIO:' sections and step rows of a mapping analysis.
+    Text is fed as it grows (streamed chunks, completion attempts) and only the new part is parsed.
+    """
     
-    # Count scenarios in output
-    scenario_count_in_output = len(re.findall(r'### SCENARIO:', llm_output, re.IGNORECASE))
+    def __init__(self, text=""):
+        self.length = 0
+        self.lines = MappingLines()
+        self.tail = ""
+        self._tail_lines = None
+        self.feed(text)
     
-    # Count steps in output 
-    step_count_in_output = len(re.findall(r'\| (Given|When|Then|And) ', llm_output, re.IGNORECASE))
+    def feed(self, text):
+        """
+        Index text appended to the analysis
+        """
+        if not text:
+            return
+        self.length += len(text)
+        pieces = (self.tail + text).split('\n')
+        self.tail = pieces.pop()
+        for line in pieces:
+            self.lines.add_line(line)
+        self._tail_lines = None
     
-    # Count original scenarios and steps
-    original_scenario_count = len(original_scenarios)
-    original_step_count = sum(len(scenario['steps']) for scenario in original_scenarios)
+    def sync(self, text):
+        """
+        Index whatever text has grown by since the last call (text must extend what was fed)
+        """
+        self.feed(text[self.length:])
     
-    print(f"📊 Scenario Coverage: {scenario_count_in_output}/{original_scenario_count}")
-    print(f"📊 Step Coverage: {step_count_in_output}/{original_step_count}")
+    def _parts(self):
+        if not self.tail:
+            return (self.lines,)
+        if self._tail_lines is None:
+            self._tail_lines = MappingLines()
+            self._tail_lines.add_line(self.tail)
+        return (self.lines, self._tail_lines)
     
-    # Check if all scenarios are present
-    for scenario in original_scenarios:
+    @property
+    def scenario_count(self):
+        return sum(part.scenario_count for part in self._parts())
+    
+    @property
+    def step_count(self):
+        return sum(part.step_count for part in self._parts())
+    
+    def has_scenario(self, name):
+        name = name.lower()
+        return any(part.has_scenario(name) for part in self._parts())
+    
+    def has_step(self, step_type, step_text):
+        keyword = step_type.lower()
+        prefix = step_text[:20].lower()
+        return any(part.has_step(keyword, prefix) for part in self._parts())
+    
+    def scenario_issues(self, scenario):
+        """
+        Missing heading or steps of a single scenario
+        """
         scenario_name = scenario['name'].strip()
-        # More flexible matching for scenario names
-        if not re.search(rf"### SCENARIO:.*{re.escape(scenario_name)}", llm_output, re.IGNORECASE):
-            issues.append(f"Missing scenario: {scenario_name}")
-        else:
-            # Check if all steps are present for this scenario
-            for step in scenario['steps']:
-                step_type = step['type']
-                step_text = step['text'][:50]  # First 50 chars for better matching
-                # Look for this step in the output
-                step_pattern = rf"\| {re.escape(step_type)}.*{re.escape(step_text[:20])}"
-                if not re.search(step_pattern, llm_output, re.IGNORECASE):
-                    issues.append(f"Missing step in '{scenario_name}': {step_type} {step_text}...")
+        if not self.has_scenario(scenario_name):
+            return [f"Missing scenario: {scenario_name}"]
+        
+        # Check if all steps are present for this scenario
+        issues = []
+        for step in scenario['steps']:
+            step_text = step['text'][:50]
+            if not self.has_step(step['type'], step_text):
+                issues.append(f"Missing step in '{scenario_name}': {step['type']} {step_text}...")
+        return issues
     
-    # Additional validation
-    if scenario_count_in_output < original_scenario_count:
-        issues.append(f"Only {scenario_count_in_output} scenarios mapped, need {original_scenario_count}")
+    def issues(self, scenarios, first_only=False):
+        """
+        Coverage problems of the indexed analysis against the parsed scenarios
+        """
+        issues = []
+        for scenario in scenarios:
+            issues.extend(self.scenario_issues(scenario))
+            if first_only and issues:
+                return issues
+        
+        original_scenario_count = len(scenarios)
+        original_step_count = sum(len(scenario['steps']) for scenario in scenarios)
+        
+        if self.scenario_count < original_scenario_count:
+            issues.append(f"Only {self.scenario_count} scenarios mapped, need {original_scenario_count}")
+        
+        if self.step_count < original_step_count:
+            issues.append(f"Only {self.step_count} steps mapped, need {original_step_count}")
+        
+        return issues
+
+def validate_scenario_completeness(llm_output, feature_content, verbose=True, index=None, scenarios=None):
+    """
+    Validate that all scenarios and steps are included in the LLM output.
+    Pass an up-to-date MappingCoverageIndex (and pre-parsed scenarios) to avoid re-scanning the output.
+    """
+    # Parse original scenarios
+    if scenarios is None:
+        scenarios = parse_gherkin_scenarios(feature_content)
+    if index is None:
+        index = MappingCoverageIndex(llm_output)
     
-    if step_count_in_output < original_step_count:
-        issues.append(f"Only {step_count_in_output} steps mapped, need {original_step_count}")
+    if verbose:
+        print(f"📊 Scenario Coverage: {index.scenario_count}/{len(scenarios)}")
+        print(f"📊 Step Coverage: {index.step_count}/{sum(len(scenario['steps']) for scenario in scenarios)}")
     
-    return issues
+    return index.issues(scenarios)
 
 def generate_completeness_prompt(ui_elements_json, api_endpoints_json, feature_file_content, missing_items):
     """
     Generate a prompt to complete missing scenarios/steps
     """
     
-    prompt = f"""CRITICAL: You missed several scenarios and steps. Complete ALL missing items below.
+    header = f"""CRITICAL: You missed several scenarios and steps. Complete ALL missing items below.
 
 ## WHAT YOU MISSED:
 {chr(10).join(missing_items)}
@@ -369,22 +726,18 @@ def generate_completeness_prompt(ui_elements_json, api_endpoints_json, feature_f
 ## AVAILABLE ELEMENTS (USE ONLY THESE WITH EXACT SELECTORS):
 """
     
-    for i, element in enumerate(ui_elements_json):
-        selector = element.get('selector', 'N/A')
-        element_type = element.get('type', 'N/A') 
-        text = element.get('text', element.get('placeholder', 'N/A'))
-        prompt += f"Element {i+1}: selector=\"{selector}\" type=\"{element_type}\" text=\"{text}\"\n"
-    
-    prompt += f"""
-## AVAILABLE ENDPOINTS (USE ONLY THESE WITH EXACT URLS):
-"""
+    element_lines = [
+        f"Element {i+1}: selector=\"{element.get('selector', 'N/A')}\" type=\"{element.get('type', 'N/A')}\" "
+        f"text=\"{element.get('text', element.get('placeholder', 'N/A'))}\"\n"
+        for i, element in enumerate(ui_elements_json)
+    ]
     
-    for i, endpoint in enumerate(api_endpoints_json):
-        method = endpoint.get('method', 'N/A')
-        url = endpoint.get('url', 'N/A')
-        prompt += f"Endpoint {i+1}: method=\"{method}\" url=\"{url}\"\n"
+    endpoint_lines = [
+        f"Endpoint {i+1}: method=\"{endpoint.get('method', 'N/A')}\" url=\"{endpoint.get('url', 'N/A')}\"\n"
+        for i, endpoint in enumerate(api_endpoints_json)
+    ]
     
-    prompt += f"""
+    footer = f"""
 ## ABSOLUTE REQUIREMENTS:
 
 ### SCENARIO COMPLETION:
@@ -418,11 +771,274 @@ def generate_completeness_prompt(ui_elements_json, api_endpoints_json, feature_f
 ## GENERATE COMPLETE MAPPINGS NOW:
 Create tables for ALL scenarios with ALL steps. Miss nothing."""
     
-    return prompt
+    return "".join([
+        header,
+        *element_lines,
+        "\n## AVAILABLE ENDPOINTS (USE ONLY THESE WITH EXACT URLS):\n",
+        *endpoint_lines,
+        footer,
+    ])
+
+def split_feature_for_prompt(ui_elements_json, api_endpoints_json, feature_file_content, token_budget=None):
+    """
+    Split the feature into scenario groups whose mapping prompt fits the token budget.
+    Returns (group content, UI elements, API endpoints) per group. Each group keeps the
+    Feature header and Background so it still parses on its own. When the catalog alone
+    leaves no room for a scenario, each group only gets the catalog entries relevant to
+    its own scenarios.
+    """
+    if token_budget is None:
+        token_budget = PROMPT_TOKEN_BUDGET
+
+    whole = [(feature_file_content, ui_elements_json, api_endpoints_json)]
+    if estimate_tokens(create_llm_enhanced_prompt(ui_elements_json, api_endpoints_json, feature_file_content)) <= token_budget:
+        return whole
+
+    header, blocks = split_feature_blocks(feature_file_content)
+    if not blocks:
+        return whole
+
+    # Everything except the scenario blocks is paid once per group
+    block_tokens = [estimate_tokens(block) for block in blocks]
+    fixed_tokens = estimate_tokens(create_llm_enhanced_prompt(ui_elements_json, api_endpoints_json, header))
+    if fixed_tokens + max(block_tokens) <= token_budget:
+        groups = pack_by_budget(blocks, block_tokens, token_budget - fixed_tokens)
+        return [(header + "".join(group), ui_elements_json, api_endpoints_json) for group in groups]
+
+    # The whole catalog does not fit: each scenario costs its block plus the entries it needs,
+    # which bounds the cost of the entries a group needs
+    ui_index = UIElementIndex(ui_elements_json)
+    api_index = APIEndpointIndex(api_endpoints_json)
+    scenarios = parse_gherkin_scenarios(feature_file_content)
+    empty_tokens = estimate_tokens(create_llm_enhanced_prompt([], [], ""))
+    costs = [
+        estimate_tokens(create_llm_enhanced_prompt(*relevant_catalog([scenario], ui_index, api_index), block)) - empty_tokens
+        for scenario, block in zip(scenarios, blocks)
+    ]
+    fixed_tokens = estimate_tokens(create_llm_enhanced_prompt([], [], header))
+    groups = pack_by_budget(list(range(len(blocks))), costs, token_budget - fixed_tokens)
+    return [
+        (header + "".join(blocks[i] for i in group), *relevant_catalog([scenarios[i] for i in group], ui_index, api_index))
+        for group in groups
+    ]
+
+# How completion attempts resend work: 'scoped' (only missing scenarios with their
+# relevant catalog entries), 'chat' (follow-up on the first-pass context array)
+# or 'full' (whole feature and catalog again)
+COMPLETION_MODE = os.environ.get("COMPLETION_MODE", "scoped").lower()
+COMPLETION_WORKERS = int(os.environ.get("COMPLETION_WORKERS", "4"))
+
+def relevant_catalog(scenarios, ui_index, api_index, ui_top_k=3, api_top_k=2):
+    """
+    Catalog entries that score for at least one step of the scenarios, in catalog order.
+    A catalog with no scoring entry is returned whole so the model is never left without data.
+    """
+    ui_hits = set()
+    api_hits = set()
+    for scenario in scenarios:
+        for step in scenario['steps']:
+            ui_hits.update(id(element) for element, _ in ui_index.search(step['text'], top_k=ui_top_k))
+            api_hits.update(id(endpoint) for endpoint, _ in api_index.search(step['text'], top_k=api_top_k))
+    
+    ui_elements = [element for element in ui_index.ui_elements if id(element) in ui_hits]
+    api_endpoints = [endpoint for endpoint in api_index.api_endpoints if id(endpoint) in api_hits]
+    return ui_elements or ui_index.ui_elements, api_endpoints or api_index.api_endpoints
+
+def generate_followup_prompt(scenario_content, missing_items):
+    """
+    Follow-up asking to map only the missing items, reusing the catalog already in the first-pass context
+    """
+    return f"""You skipped part of the mapping. Map ONLY the items below, using the same elements, endpoints and table format as before.
+
+## WHAT YOU MISSED:
+{chr(10).join(missing_items)}
+
+## SCENARIOS TO MAP:
+{scenario_content}
+
+Start each table with "### SCENARIO: [Exact Scenario Name]" and include every step."""
+
+def complete_missing_scenarios(ui_elements_json, api_endpoints_json, group_content, scenarios, index, context=None):
+    """
+    Re-map only the scenarios the analysis is missing, one concurrent request per scenario.
+    Returns (completions, error); with the first pass's context array each request is a
+    follow-up continuing it, otherwise a scoped completeness prompt.
+    """
+    header, blocks = split_feature_blocks(group_content)
+    pending = []
+    for scenario, block in zip(scenarios, blocks):
+        issues = index.scenario_issues(scenario)
+        if issues:
+            pending.append((scenario, block, issues))
+    if not pending:
+        return [], None
+    
+    catalog_index = None
+    if context is None:
+        catalog_index = (UIElementIndex(ui_elements_json), APIEndpointIndex(api_endpoints_json))
+    
+    def complete(item):
+        scenario, block, issues = item
+        scenario_content = header + block
+        if context is not None:
+            return run_mistral(generate_followup_prompt(scenario_content, issues), use_cache=False, context=context)
+        
+        ui_subset, api_subset = relevant_catalog([scenario], *catalog_index)
+        return run_mistral(generate_completeness_prompt(ui_subset, api_subset, scenario_content, issues), use_cache=False)
+    
+    print(f"🎯 Re-mapping {len(pending)} incomplete scenario(s)")
+    with ThreadPoolExecutor(max_workers=max(1, COMPLETION_WORKERS)) as executor:
+        results = list(executor.map(complete, pending))
+    
+    for _, error in results:
+        if error is not None:
+            return None, error
+    return [output.strip() for output, _ in results], None
+
+def map_scenario_group(ui_elements_json, api_endpoints_json, group_content):
+    """
+    Run the mapping analysis for one scenario group, with up to 2 completion attempts.
+    Returns (analysis, missing_items, error).
+    """
+    llm_prompt = create_llm_enhanced_prompt(ui_elements_json, api_endpoints_json, group_content)
+    scenarios = parse_gherkin_scenarios(group_content)
+    
+    # Stop generating as soon as every scenario table and step is present;
+    # the index only parses the text streamed since the previous check
+    stream_index = MappingCoverageIndex()
+    
+    def all_mapped(partial):
+        stream_index.sync(partial)
+        return not stream_index.issues(scenarios, first_only=True)
+    
+    # In chat mode the first pass is never served from the cache: follow-ups
+    # continue from the context array of the answer Ollama actually produced
+    first_pass = {}
+    stdout, stderr = run_mistral(llm_prompt, stop_when=all_mapped, use_cache=COMPLETION_MODE != 'chat',
+                                 on_done=first_pass.update)
+    if stderr is not None:
+        return None, None, stderr
+    
+    llm_analysis = stdout.strip()
+    
+    # Validate completeness
+    index = MappingCoverageIndex(llm_analysis)
+    missing_items = validate_scenario_completeness(llm_analysis, group_content, index=index, scenarios=scenarios)
+    
+    # If items are missing, run up to 2 completion attempts
+    completion_attempts = 0
+    max_attempts = 2
+    
+    while missing_items and completion_attempts < max_attempts:
+        completion_attempts += 1
+        print(f"⚠️ Attempt {completion_attempts}: Found {len(missing_items)} missing items. Completing...")
+        
+        completions = []
+        stderr_complete = None
+        if COMPLETION_MODE in ('scoped', 'chat'):
+            # Resend only the scenarios that are still incomplete
+            context = first_pass.get('context') if COMPLETION_MODE == 'chat' else None
+            completions, stderr_complete = complete_missing_scenarios(
+                ui_elements_json, api_endpoints_json, group_content, scenarios, index, context
+            )
+        
+        if not completions and stderr_complete is None:
+            # Run the full completeness prompt
+            completeness_prompt = generate_completeness_prompt(
+                ui_elements_json, api_endpoints_json, group_content, missing_items
+            )
+            stdout_complete, stderr_complete = run_mistral(completeness_prompt, use_cache=False)
+            if stderr_complete is None:
+                completions = [stdout_complete.strip()]
+        
+        if stderr_complete is None:
+            # Append completion to original
+            completion = f"\n\n## COMPLETION ATTEMPT {completion_attempts}:\n" + "\n\n".join(completions)
+            llm_analysis = llm_analysis + completion
+            
+            # Re-validate, indexing only the appended completion
+            index.feed(completion)
+            missing_items = validate_scenario_completeness(llm_analysis, group_content, index=index, scenarios=scenarios)
+            
+            if not missing_items:
+                print(f"✅ All scenarios completed on attempt {completion_attempts}")
+                break
+        else:
+            print(f"⚠️ Completion attempt {completion_attempts} failed: {stderr_complete}")
+            break
+    
+    if missing_items:
+        print(f"⚠️ Still missing {len(missing_items)} items after {completion_attempts} attempts")
+        for item in missing_items:
+            print(f"   - {item}")
+    
+    return llm_analysis, missing_items, None
+
+def create_basic_mapping(scenarios, ui_elements_json, api_endpoints_json):
+    """
+    Keyword-matched mapping tables in the analysis format, for a group the LLM could not map
+    """
+    sections = []
+    for mapping in generate_step_mapping(scenarios, ui_elements_json, api_endpoints_json):
+        rows = [
+            f"### SCENARIO: {mapping['scenario_name']}",
+            "| Step | Element(s) Used | Selector(s) | Action Type | API Triggered |",
+            "|------|----------------|-------------|-------------|---------------|",
+        ]
+        for step in mapping['steps']:
+            elements = [element for element, _ in step['ui_elements']]
+            names = ', '.join(str(element.get('text') or element.get('type', 'N/A')) for element in elements) or 'None'
+            selectors = ', '.join(element.get('selector', 'N/A') for element in elements) or 'N/A'
+            endpoints = ', '.join(
+                f"{endpoint.get('method', 'N/A')} {endpoint.get('url', 'N/A')}" for endpoint, _ in step['api_endpoints']
+            ) or 'None'
+            rows.append(f"| {step['step_type']} {step['step_text']} | {names} | {selectors} | {'/'.join(step['actions'])} | {endpoints} |")
+        sections.append("\n".join(rows))
+    return "\n\n".join(sections)
+
+def merge_mapping_analyses(analyses):
+    """
+    Merge the mapping tables of every scenario group into one analysis
+    """
+    return "\n\n".join(analysis for analysis in analyses if analysis)
+
+def split_mapping_sections(analysis):
+    """
+    Split a mapping analysis into (heading, text) pairs, one per '### SCENARIO:' section
+    """
+    sections = []
+    current = None
+    for line in analysis.split('\n'):
+        lowered = line.lower()
+        heading_at = lowered.find(SCENARIO_HEADING)
+        if heading_at != -1:
+            current = [lowered[heading_at + len(SCENARIO_HEADING):].strip(), [line]]
+            sections.append(current)
+        elif line.startswith('## '):
+            # '## COMPLETION ATTEMPT n:' and similar markers end a section
+            current = None
+        elif current is not None:
+            current[1].append(line)
+    return [(heading, '\n'.join(lines).strip()) for heading, lines in sections]
+
+def scenario_mapping_sections(analysis, scenarios):
+    """
+    The mapping text of each scenario: its sections with an exact heading, else those naming it
+    """
+    sections = split_mapping_sections(analysis)
+    mappings = []
+    for scenario in scenarios:
+        name = scenario['name'].strip().lower()
+        matched = [text for heading, text in sections if heading == name]
+        if not matched:
+            matched = [text for heading, text in sections if name in heading]
+        mappings.append("\n\n".join(matched))
+    return mappings
 
-def generate_test_implementation_prompt(ui_elements_json, api_endpoints_json, feature_file_content):
+def generate_test_implementation_prompt(ui_elements_json, api_endpoints_json, feature_file_content, manifest=None):
     """
-    Create a comprehensive test implementation prompt with completeness validation
+    Create a comprehensive test implementation prompt with completeness validation.
+    With a manifest, scenarios unchanged since the last run reuse their recorded mapping.
     """
     
     # Parse scenarios for tracking
@@ -432,78 +1048,68 @@ def generate_test_implementation_prompt(ui_elements_json, api_endpoints_json, fe
     
     print(f"🎯 Target: {total_scenarios} scenarios with {total_steps} total steps")
     
-    # First create the LLM-enhanced analysis prompt
-    llm_prompt = create_llm_enhanced_prompt(ui_elements_json, api_endpoints_json, feature_file_content)
+    # Look up the mapping of every unchanged scenario (its source block plus the feature header)
+    header, blocks = split_feature_blocks(feature_file_content)
+    keys = scenario_keys([scenario['name'] for scenario in scenarios])
+    cached = {}
+    if manifest is not None and len(blocks) == len(scenarios):
+        for i, key in enumerate(keys):
+            mapping = manifest.lookup(key, header + blocks[i])
+            if mapping is not None:
+                cached[i] = mapping
+        if cached:
+            print(f"🧾 Reusing mappings for {len(cached)} unchanged scenario(s)")
+    pending = [i for i in range(len(scenarios)) if i not in cached]
+    
+    mapping_content = feature_file_content
+    if cached:
+        mapping_content = header + "".join(blocks[i] for i in pending)
     
-    # Run it through LLM to get intelligent mappings
-    cmd = ['ollama', 'run', 'mistral', llm_prompt]
+    # Split the work into scenario groups that fit the model's context window
+    groups = split_feature_for_prompt(ui_elements_json, api_endpoints_json, mapping_content) if pending else []
+    if len(groups) > 1:
+        print(f"✂️ Feature split into {len(groups)} scenario groups to fit {PROMPT_TOKEN_BUDGET} prompt tokens")
     
+    # Run each group through LLM to get intelligent mappings
     try:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8',
-            errors='replace'
-        )
-        
-        stdout, stderr = process.communicate()
-        
-        if process.returncode == 0:
-            llm_analysis = stdout.strip()
-            
-            # Validate completeness
-            missing_items = validate_scenario_completeness(llm_analysis, feature_file_content)
-            
-            # If items are missing, run up to 2 completion attempts
-            completion_attempts = 0
-            max_attempts = 2
-            
-            while missing_items and completion_attempts < max_attempts:
-                completion_attempts += 1
-                print(f"⚠️ Attempt {completion_attempts}: Found {len(missing_items)} missing items. Completing...")
-                
-                completeness_prompt = generate_completeness_prompt(
-                    ui_elements_json, api_endpoints_json, feature_file_content, missing_items
-                )
-                
-                # Run completeness prompt
-                cmd_complete = ['ollama', 'run', 'mistral', completeness_prompt]
-                process_complete = subprocess.Popen(
-                    cmd_complete,
-                    stdout=subprocess.PIPE,
-                    stderr=subprocess.PIPE,
-                    text=True,
-                    encoding='utf-8',
-                    errors='replace'
-                )
-                
-                stdout_complete, stderr_complete = process_complete.communicate()
-                
-                if process_complete.returncode == 0:
-                    # Append completion to original
-                    llm_analysis = llm_analysis + f"\n\n## COMPLETION ATTEMPT {completion_attempts}:\n" + stdout_complete.strip()
-                    
-                    # Re-validate
-                    missing_items = validate_scenario_completeness(llm_analysis, feature_file_content)
-                    
-                    if not missing_items:
-                        print(f"✅ All scenarios completed on attempt {completion_attempts}")
-                        break
-                else:
-                    print(f"⚠️ Completion attempt {completion_attempts} failed: {stderr_complete}")
-                    break
-            
-            if missing_items:
-                print(f"⚠️ Still missing {len(missing_items)} items after {completion_attempts} attempts")
-                for item in missing_items:
-                    print(f"   - {item}")
-            else:
-                print("✅ All scenarios and steps are complete")
-            
-            # Now create the final implementation prompt
-            final_prompt = f"""You are an expert test automation engineer. Implement executable test code using the detailed mapping analysis below.
+        analyses = []
+        missing_items = []
+        unmapped = set()
+        for group_number, (group_content, group_ui, group_api) in enumerate(groups, 1):
+            if len(groups) > 1:
+                print(f"🧩 Mapping scenario group {group_number}/{len(groups)}")
+            analysis, group_missing, error = map_scenario_group(group_ui, group_api, group_content)
+            if error is not None:
+                print(f"⚠️ LLM Error: {error}. Retrying the group...")
+                analysis, group_missing, error = map_scenario_group(group_ui, group_api, group_content)
+            if error is not None:
+                print(f"❌ LLM Error: {error}")
+                # Fall back to keyword matching for this group only
+                group_scenarios = parse_gherkin_scenarios(group_content)
+                analysis = create_basic_mapping(group_scenarios, group_ui, group_api)
+                group_missing = []
+                unmapped.update(scenario['name'] for scenario in group_scenarios)
+            analyses.append(analysis)
+            missing_items.extend(group_missing)
+        
+        llm_analysis = merge_mapping_analyses(analyses)
+        
+        if manifest is not None and len(blocks) == len(scenarios):
+            # Record each fully mapped scenario, then splice cached and fresh mappings in feature order
+            fresh = dict(zip(pending, scenario_mapping_sections(llm_analysis, [scenarios[i] for i in pending])))
+            for i, mapping in fresh.items():
+                if mapping and scenarios[i]['name'] not in unmapped and not MappingCoverageIndex(mapping).scenario_issues(scenarios[i]):
+                    manifest.record(keys[i], header + blocks[i], mapping)
+            if cached:
+                llm_analysis = merge_mapping_analyses(cached.get(i) or fresh.get(i) for i in range(len(scenarios)))
+        
+        if missing_items:
+            print(f"⚠️ Still missing {len(missing_items)} items in total")
+        else:
+            print("✅ All scenarios and steps are complete")
+        
+        # Now create the final implementation prompt
+        final_prompt = f"""You are an expert test automation engineer. Implement executable test code using the detailed mapping analysis below.
 
 ## DETAILED STEP-BY-STEP MAPPING ANALYSIS:
 {llm_analysis}
@@ -569,12 +1175,8 @@ Generate complete, executable test code that:
 7. **Maintainable structure** - Clean, readable, maintainable code
 
 Generate the complete test implementation now."""
-            
-            return final_prompt
-        else:
-            print(f"❌ LLM Error: {stderr}")
-            # Fallback to basic implementation
-            return create_basic_implementation_prompt(ui_elements_json, api_endpoints_json, feature_file_content)
+        
+        return final_prompt
             
     except Exception as e:
         print(f"❌ LLM Exception: {str(e)}")
@@ -590,7 +1192,7 @@ def create_basic_implementation_prompt(ui_elements_json, api_endpoints_json, fea
     total_scenarios = len(scenarios)
     total_steps = sum(len(scenario['steps']) for scenario in scenarios)
     
-    prompt = f"""You are an expert test automation engineer. Create executable test code using the provided data.
+    header = f"""You are an expert test automation engineer. Create executable test code using the provided data.
 
 ## COVERAGE REQUIREMENTS:
 - Must implement ALL {total_scenarios} scenarios
@@ -600,21 +1202,17 @@ def create_basic_implementation_prompt(ui_elements_json, api_endpoints_json, fea
 ## UI ELEMENTS (USE EXACT SELECTORS):
 """
     
-    for i, element in enumerate(ui_elements_json):
-        selector = element.get('selector', 'N/A')
-        element_type = element.get('type', 'N/A')
-        prompt += f"Element {i+1}: {selector} ({element_type})\n"
-
-    prompt += f"""
-## API ENDPOINTS (USE EXACT URLS):
-"""
+    element_lines = [
+        f"Element {i+1}: {element.get('selector', 'N/A')} ({element.get('type', 'N/A')})\n"
+        for i, element in enumerate(ui_elements_json)
+    ]
     
-    for i, endpoint in enumerate(api_endpoints_json):
-        method = endpoint.get('method', 'N/A')
-        url = endpoint.get('url', 'N/A')
-        prompt += f"Endpoint {i+1}: {method} {url}\n"
+    endpoint_lines = [
+        f"Endpoint {i+1}: {endpoint.get('method', 'N/A')} {endpoint.get('url', 'N/A')}\n"
+        for i, endpoint in enumerate(api_endpoints_json)
+    ]
 
-    prompt += f"""
+    footer = f"""
 ## ALL SCENARIOS TO IMPLEMENT:
 {feature_file_content}
 
@@ -627,7 +1225,13 @@ def create_basic_implementation_prompt(ui_elements_json, api_endpoints_json, fea
 Generate complete test implementation using ONLY the exact selectors and endpoints provided above.
 Ensure ALL {total_scenarios} scenarios are covered with ALL {total_steps} steps implemented."""
     
-    return prompt
+    return "".join([
+        header,
+        *element_lines,
+        "\n## API ENDPOINTS (USE EXACT URLS):\n",
+        *endpoint_lines,
+        footer,
+    ])
 
 def run_test_prompt_generator(ui_file_path, api_file_path, feature_file_path):
     """
@@ -642,27 +1246,33 @@ def run_test_prompt_generator(ui_file_path, api_file_path, feature_file_path):
         with open(api_file_path, 'r', encoding='utf-8') as f:
             api_data = json.load(f)
             
-        # Load feature file
-        with open(feature_file_path, 'r', encoding='utf-8') as f:
-            feature_content = f.read()
+        # Load feature file, counting its scenarios while it is read
+        with open(feature_file_path, 'rb') as f:
+            scenarios = parse_gherkin_scenarios(f)
+            f.seek(0)
+            feature_content = f.read().decode('utf-8')
         
         print("🚀 Starting Generic Black Box Test Generator")
         print(f"📁 UI Elements: {len(ui_data)} items")
         print(f"📁 API Endpoints: {len(api_data)} items")  
         print(f"📁 Feature File: {feature_file_path}")
         
-        # Parse and show scenario count
-        scenarios = parse_gherkin_scenarios(feature_content)
+        # Show scenario count
         total_steps = sum(len(scenario['steps']) for scenario in scenarios)
         print(f"🎯 Target: {len(scenarios)} scenarios, {total_steps} steps")
         print("-" * 60)
         
+        # Per-scenario hashes from the previous run, so only edited scenarios are re-mapped
+        manifest = Manifest(manifest_path_for('test_implementation_prompt.txt'), catalog=catalog_version(ui_data, api_data))
+        
         # Generate the test implementation prompt
-        generated_prompt = generate_test_implementation_prompt(ui_data, api_data, feature_content)
+        generated_prompt = generate_test_implementation_prompt(ui_data, api_data, feature_content, manifest=manifest)
         
         # Save the generated prompt
         with open('test_implementation_prompt.txt', 'w', encoding='utf-8') as f:
             f.write(generated_prompt)
+        manifest.save()
+        print(f"🧾 Scenario mappings: {manifest.summary()}")
         
         print("-" * 60)
         print("✅ Test implementation prompt saved to: test_implementation_prompt.txt")
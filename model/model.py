@@ -1,16 +1,44 @@
-import subprocess
-import fitz  # PyMuPDF
-
-def extract_text_from_pdf(pdf_path):
-    """Extract all text from a PDF file using PyMuPDF."""
+import os
+import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.documents import outline_query, split_document_sections
+from blackbox.gherkin import format_scenario, iter_scenarios_from_text
+from blackbox.ollama_client import OllamaError, generate, stream_to_file
+from blackbox.pdf import iter_pdf_pages
+from blackbox.retrieval import TOP_K as RETRIEVAL_TOP_K, relevant_context
+
+# Documents longer than this are generated section by section (map-reduce)
+SECTION_MAX_CHARS = int(os.environ.get("GHERKIN_SECTION_CHARS", "6000"))
+GHERKIN_WORKERS = int(os.environ.get("GHERKIN_WORKERS", "4"))
+
+def extract_text_from_pdf(pdf_path, workers=None, use_cache=True):
+    """Extract all text from a PDF file using PyMuPDF (pages in parallel, cached per page)."""
     try:
-        with fitz.open(pdf_path) as doc:
-            return "\n".join(page.get_text() for page in doc)
+        return "\n".join(text for _, text in iter_pdf_pages(pdf_path, workers=workers, use_cache=use_cache))
     except Exception as e:
         print(f"Failed to extract PDF text: {e}")
         return ""
 
-def build_blackbox_prompt(doc_text):
+def build_blackbox_prompt(doc_text, section_title=None, related=None):
+    # related: chunks from other sections that mention this section's features
+    scope = ""
+    if section_title:
+        scope = f"""The documentation below is only the "{section_title}" section of a larger document.
+Generate scenarios only for the features this section describes.
+
+"""
+    context = ""
+    if related:
+        context = f"""
+
+Related documentation from other sections (context only, do not generate scenarios for it):
+\"\"\"
+{related}
+\"\"\""""
     return f"""
 You are a QA engineer specializing in **black-box Gherkin scenario generation**.
 
@@ -47,47 +75,113 @@ Feature: <User-facing feature name>
     When ...
     Then ...
 
-Documentation:
+{scope}Documentation:
 \"\"\"
 {doc_text}
-\"\"\"
+\"\"\"{context}
 """.strip()
 
 
 
-def generate_gherkin_from_doc(doc_text, model="mistral:instruct", output_file="generated_tests.feature"):
-    """Send the prompt to Ollama and save the generated Gherkin scenarios."""
-    prompt = build_blackbox_prompt(doc_text)
-    cmd = ["ollama", "run", model, prompt]
+def generate_gherkin_from_doc(doc_text, model="mistral:instruct", output_file="generated_tests.feature", by_section=None):
+    """Send the prompt to Ollama and stream the generated Gherkin scenarios to disk.
 
-    try:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
-            errors="replace"
-        )
-        stdout, stderr = process.communicate(timeout=120)
-
-        if process.returncode != 0:
-            print(f"Model error: {stderr}")
+    by_section=None switches to per-section generation for documents longer than SECTION_MAX_CHARS.
+    """
+    if by_section is None:
+        by_section = len(doc_text) > SECTION_MAX_CHARS
+    if by_section:
+        try:
+            return generate_gherkin_by_section(doc_text, model=model, output_file=output_file)
+        except Exception as e:
+            print(f"❌ Error: {e}")
             return False
 
-        with open(output_file, "w", encoding="utf-8") as f:
-            f.write(stdout)
+    prompt = build_blackbox_prompt(doc_text)
+    try:
+        stream_to_file(prompt, output_file, model=model, timeout=120)
 
         print(f"✅ Gherkin scenarios saved to {output_file}")
         return True
 
-    except subprocess.TimeoutExpired:
+    except TimeoutError:
         print("⏱️ Ollama model timed out.")
         return False
+    except OllamaError as e:
+        print(f"Model error: {e}")
+        return False
     except Exception as e:
         print(f"❌ Error: {e}")
         return False
 
+def clean_feature_output(output, section_title):
+    """Keep only the Gherkin of a section answer, wrapping bare scenarios in a Feature."""
+    lines = [line for line in output.splitlines() if not line.strip().startswith("```")]
+    text = "\n".join(lines).strip()
+    feature_at = re.search(r"^\s*Feature:", text, re.MULTILINE)
+    if feature_at:
+        return text[feature_at.start():].strip()
+    scenario_at = re.search(r"^\s*Scenario", text, re.MULTILINE)
+    if scenario_at:
+        title = re.sub(r"^[\d.\s]+", "", section_title).strip()
+        return f"Feature: {title}\n\n  " + text[scenario_at.start():].strip()
+    return ""
+
+def merge_features(features, title):
+    """Put the scenarios of every section answer under one Feature, each section's after a comment naming it."""
+    lines = [f"Feature: {title}", ""]
+    for feature in features:
+        scenarios = list(iter_scenarios_from_text(feature))
+        if not scenarios:
+            continue
+        lines.append(f"  # {scenarios[0]['feature'] or 'Scenarios'}")
+        for scenario in scenarios:
+            lines.extend([format_scenario(scenario), ""])
+    return "\n".join(lines).rstrip() + "\n"
+
+def generate_gherkin_by_section(doc_text, model="mistral:instruct", output_file="generated_tests.feature",
+                                max_chars=None, workers=None):
+    """Generate scenarios for each document section concurrently and merge them, in document order, into one Feature."""
+    sections = split_document_sections(doc_text, max_chars or SECTION_MAX_CHARS)
+    workers = max(1, min(workers or GHERKIN_WORKERS, len(sections)))
+    print(f"🧩 {len(sections)} sections, {workers} worker(s)")
+
+    def generate_section(section):
+        related = None
+        if RETRIEVAL_TOP_K > 0 and len(sections) > 1:
+            # Add what the rest of the document says about this section's features,
+            # within the same budget as the section itself
+            related = relevant_context(doc_text, outline_query(section), exclude=section["text"],
+                                       max_chars=(max_chars or SECTION_MAX_CHARS) - len(section["text"]))
+        prompt = build_blackbox_prompt(section["text"], section_title=section["title"], related=related)
+        try:
+            return clean_feature_output(generate(prompt, model=model, timeout=120), section["title"]), None
+        except TimeoutError:
+            return None, "timed out"
+        except OllamaError as e:
+            return None, str(e)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results = list(executor.map(generate_section, sections))
+
+    features = []
+    failed = 0
+    for section, (feature, error) in zip(sections, results):
+        if error is not None:
+            failed += 1
+            print(f"❌ Section '{section['title']}' failed: {error}")
+        elif feature:
+            features.append(feature)
+        else:
+            print(f"⚠️ Section '{section['title']}' produced no scenarios")
+
+    # One Feature named after the document title (its first line)
+    title = re.sub(r"^[\d.\s]+", "", next((line.strip() for line in doc_text.splitlines() if line.strip()), "")).strip()
+    with open(output_file, "w", encoding="utf-8") as f:
+        f.write(merge_features(features, title or "Application"))
+    print(f"✅ Gherkin scenarios from {len(features)} section(s) saved to {output_file}")
+    return failed == 0
+
 if __name__ == "__main__":
     pdf_path = r"C:\Users\Selim\OneDrive\Bureau\ai test\docs\cahier.pdf"
     documentation_text = extract_text_from_pdf(pdf_path)
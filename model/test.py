@@ -1,4 +1,8 @@
-import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.ollama_client import OllamaError, code_fence_closed, stream_to_file
 
 # Your complete prompt as a string
 PROMPT = """You are an expert test automation engineer. Implement executable test code using the detailed mapping analysis below.
@@ -202,23 +206,22 @@ Generate complete, executable test code that:
 
 Generate the complete test implementation now."""
 
-def generate_test_code(prompt: str, output_file: str = "generated_tests.py"):
+def generate_test_code(prompt: str, output_file: str = "generated_tests.py", stop_at_fence: bool = False):
     """
     Generates test code from the prompt using Ollama Mistral
+
+    The answer is written to output_file as it streams in. With stop_at_fence,
+    generation stops once the first fenced code block is closed.
     """
-    cmd = ['ollama', 'run', 'mistral', prompt]
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        encoding='utf-8',
-        errors='replace'
-    )
-    stdout, _ = process.communicate()
-    
-    with open(output_file, 'w') as f:
-        f.write(stdout.strip())
+    try:
+        stream_to_file(
+            prompt,
+            output_file,
+            model='mistral',
+            stop_when=code_fence_closed if stop_at_fence else None
+        )
+    except OllamaError as e:
+        print(f"Error running Ollama: {e}")
     
     return output_file
 
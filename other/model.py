@@ -1,9 +1,29 @@
-import subprocess
 import json
+import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-def build_blackbox_prompt(doc_text):
-    """Create a strictly generic blackbox testing prompt"""
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.ollama_client import OllamaError, generate
+from blackbox.retrieval import CHUNK_CHARS, TOP_K, relevant_context
+
+# Functional areas generated one prompt each when the data is too large to paste whole
+FUNCTIONAL_AREAS = [
+    "User Registration",
+    "User Authentication",
+    "CRUD Operations",
+    "UI State Validation",
+]
+
+def build_blackbox_prompt(doc_text, query=None):
+    """Create a strictly generic blackbox testing prompt
+    
+    With a query, only the data chunks relevant to it are included and only that area is requested.
+    """
+    focus = ""
+    if query:
+        doc_text = relevant_context(doc_text, query) or doc_text
+        focus = f"\nOnly generate the {query} scenarios for this request.\n"
     return f"""
 Generate comprehensive Gherkin test scenarios from the provided application data following these strict rules:
 
@@ -45,33 +65,30 @@ Generate scenarios covering all observed:
 - CRUD operations
 - UI state changes
 - API interactions
-"""
+{focus}"""
 
 def generate_gherkin_from_doc(doc_text, model="mistral", output_file="generated_tests.feature"):
     """Send the prompt to Ollama and save the generated Gherkin scenarios."""
-    prompt = build_blackbox_prompt(doc_text)
-    cmd = ["ollama", "run", model, prompt]
-
     try:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
-            errors="replace"
-        )
-        stdout, stderr = process.communicate()
-        
-        if process.returncode == 0:
-            with open(output_file, "w") as f:
-                f.write(stdout)
-            print(f"Success! Scenarios saved to {output_file}")
-            return True
+        if TOP_K > 0 and len(doc_text) > TOP_K * CHUNK_CHARS:
+            # One prompt per functional area with only its relevant chunks, merged in area order
+            with ThreadPoolExecutor(max_workers=len(FUNCTIONAL_AREAS)) as executor:
+                answers = executor.map(
+                    lambda area: generate(build_blackbox_prompt(doc_text, query=area), model=model),
+                    FUNCTIONAL_AREAS
+                )
+                stdout = "\n\n".join(answer.strip() for answer in answers)
         else:
-            print(f"Error generating scenarios:\n{stderr}")
-            return False
+            stdout = generate(build_blackbox_prompt(doc_text), model=model)
+        
+        with open(output_file, "w") as f:
+            f.write(stdout)
+        print(f"Success! Scenarios saved to {output_file}")
+        return True
             
+    except OllamaError as e:
+        print(f"Error generating scenarios:\n{e}")
+        return False
     except Exception as e:
         print(f"Execution failed: {e}")
         return False
@@ -1,14 +1,25 @@
-import subprocess
 import json
+import os
 import re
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.gherkin import format_step, iter_scenarios_from_text, lift_background, split_feature_blocks
+from blackbox.manifest import Manifest, catalog_version, content_hash, scenario_keys
+from blackbox.ollama_client import code_fence_closed, stream
+
 class PlaywrightTestGenerator:
-    def __init__(self, test_data_path, feature_file_path, output_dir="generated_tests"):
+    def __init__(self, test_data_path, feature_file_path, output_dir="generated_tests", manifest_path=None):
         self.test_data = self._load_json(test_data_path)
-        self.scenarios = self._load_feature_file(feature_file_path)
+        # Steps every scenario starts with (e.g. the recorded login) become one Background
+        self.scenarios, self.background = lift_background(self._load_feature_file(feature_file_path))
         self.output_dir = Path(output_dir)
         self.model = "mistral"
+        # With a manifest, tests are generated per scenario and unchanged ones are reused
+        self.manifest = None
+        if manifest_path is not None:
+            self.manifest = Manifest(manifest_path, catalog=catalog_version(self.test_data))
         
     def _load_json(self, path):
         with open(path) as f:
@@ -58,6 +69,19 @@ class PlaywrightTestGenerator:
         patterns["ui_states"] = list(patterns["ui_states"])
         return patterns
     
+    def _background_requirements(self):
+        """Prompt lines asking for the lifted Background to be implemented once as a fixture"""
+        if not self.background:
+            return ""
+        steps = "\n".join(format_step(step, "  ") for step in self.background)
+        return f"""
+BACKGROUND (shared by every scenario):
+{steps}
+Implement these steps ONCE, as a `backgroundPage` fixture built with test.extend() that performs
+them on `page` and passes it to the test. Test cases take `backgroundPage` and NEVER repeat these steps.
+If these steps log in, build `backgroundPage` on `loggedInPage` instead of filling the login form.
+"""
+
     def _generate_llm_prompt(self, patterns):
         """Create strict blackbox prompt for test generation"""
         return f"""
@@ -70,6 +94,10 @@ RULES:
 4. Handle dynamic selectors using these patterns: {patterns['dynamic_selectors']}
 5. Structure tests using Page Object Model
 6. Include both UI and API assertions
+7. Log in ONCE per user: a `loggedInPage` fixture POSTs the credentials to the backend `/login` route,
+   stores the returned JWT as localStorage `token` in a saved storageState file, and gives tests a page
+   whose context starts from that storageState; tests that start logged in ("Given I am logged in", or a
+   login followed by other steps) take `loggedInPage` instead of filling the login form
 
 ELEMENTS:
 - Authentication: {patterns['auth_elements']}
@@ -80,7 +108,7 @@ ENDPOINTS:
 - CRUD Operations: {patterns['crud_endpoints']}
 
 UI STATES OBSERVED: {patterns['ui_states']}
-
+{self._background_requirements()}
 GHERKIN SCENARIOS:
 {self.scenarios}
 
@@ -101,20 +129,88 @@ OUTPUT REQUIREMENTS:
    [Dynamic selector helpers...]
 """
 
+    def _generate_scaffold_prompt(self, patterns):
+        """Prompt for the shared page objects, fixtures and helpers (no test cases)"""
+        return f"""
+Generate the shared part of a Playwright test file following STRICT BLACKBOX principles:
+
+RULES:
+1. NEVER assume application functionality or domain
+2. Use ONLY these element patterns and API endpoints
+3. Treat all elements as generic resources
+4. Handle dynamic selectors using these patterns: {patterns['dynamic_selectors']}
+5. Structure tests using Page Object Model
+6. Provide a `loggedInPage` fixture that logs in ONCE per user by POSTing the credentials to the backend
+   `/login` route, stores the returned JWT as localStorage `token` in a saved storageState file, and
+   gives tests a page whose context starts from that storageState
+
+ELEMENTS:
+- Authentication: {patterns['auth_elements']}
+- CRUD Operations: {patterns['crud_elements']}
+
+ENDPOINTS:
+- Authentication: {patterns['auth_endpoints']}
+- CRUD Operations: {patterns['crud_endpoints']}
+
+UI STATES OBSERVED: {patterns['ui_states']}
+{self._background_requirements()}
+OUTPUT REQUIREMENTS:
+1. A single ```javascript code block, using async/await Playwright syntax
+2. Include ONLY these sections (test cases are generated separately):
+   // PAGE OBJECTS
+   [Page class implementations...]
+   
+   // TEST FIXTURES
+   [Test setup/teardown...]
+   
+   // HELPER FUNCTIONS
+   [Dynamic selector helpers...]
+"""
+
+    def _generate_scenario_prompt(self, patterns, scenario_content, scaffold_code):
+        """Prompt for the test case of a single scenario, built on the shared page objects"""
+        background = ""
+        if self.background:
+            background = """7. The Background steps are already performed by the `backgroundPage` fixture:
+   take `backgroundPage` as the page and start from the state it leaves
+"""
+        return f"""
+Generate the Playwright test case for ONE Gherkin scenario following STRICT BLACKBOX principles:
+
+RULES:
+1. NEVER assume application functionality or domain
+2. Use ONLY these element patterns and API endpoints
+3. Use the page objects, fixtures and helpers already defined in the file (below); do NOT redefine them
+4. Handle dynamic selectors using these patterns: {patterns['dynamic_selectors']}
+5. Include both UI and API assertions
+6. If the scenario starts logged in ("Given I am logged in", or a login followed by other steps),
+   use the `loggedInPage` fixture instead of filling the login form
+{background}
+ELEMENTS:
+- Authentication: {patterns['auth_elements']}
+- CRUD Operations: {patterns['crud_elements']}
+
+ENDPOINTS:
+- Authentication: {patterns['auth_endpoints']}
+- CRUD Operations: {patterns['crud_endpoints']}
+
+SHARED CODE ALREADY IN THE FILE:
+```javascript
+{scaffold_code}
+```
+
+GHERKIN SCENARIO:
+{scenario_content}
+
+OUTPUT REQUIREMENTS:
+1. A single ```javascript code block containing only the test() for this scenario
+2. Use async/await Playwright syntax
+"""
+
     def _call_ollama(self, prompt):
-        """Execute Ollama with the given prompt"""
-        cmd = ["ollama", "run", self.model, prompt]
+        """Execute Ollama with the given prompt, stopping once the code block is closed"""
         try:
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                encoding="utf-8",
-                errors="replace"
-            )
-            stdout, stderr = process.communicate()
-            return stdout if process.returncode == 0 else None
+            return "".join(stream(prompt, model=self.model, stop_when=code_fence_closed))
         except Exception as e:
             print(f"Ollama execution failed: {e}")
             return None
@@ -139,11 +235,59 @@ OUTPUT REQUIREMENTS:
             f.write(content)
         print(f"Tests generated at: {output_path}")
     
+    def _generate_part(self, key, content, prompt):
+        """Code for one part of the file, from the manifest when its content is unchanged"""
+        cached = self.manifest.lookup(key, content)
+        if cached is not None:
+            print(f"Reusing generated code for: {key}")
+            return cached
+        
+        print(f"Generating code for: {key}")
+        llm_output = self._call_ollama(prompt)
+        if not llm_output:
+            return None
+        part_code = self._extract_test_code(llm_output)
+        self.manifest.record(key, content, part_code)
+        return part_code
+    
+    def _generate_incremental(self, patterns):
+        """Generate the shared code and one test per scenario, reusing unchanged parts from the manifest"""
+        header, blocks = split_feature_blocks(self.scenarios)
+        names = [scenario['name'] for scenario in iter_scenarios_from_text(self.scenarios)]
+        scaffold_prompt = self._generate_scaffold_prompt(patterns)
+        scaffold_code = self._generate_part("__scaffold__", scaffold_prompt, scaffold_prompt)
+        if scaffold_code is None:
+            return None
+        
+        # Tests are written against the scaffold, so a new scaffold regenerates every test
+        scaffold_hash = content_hash(scaffold_code)
+        code = [scaffold_code]
+        for key, block in zip(scenario_keys(names), blocks):
+            # The Background lives in the shared fixture, so the scenario prompt only needs its own steps
+            prompt = self._generate_scenario_prompt(patterns, block if self.background else header + block, scaffold_code)
+            part_code = self._generate_part(key, [header + block, scaffold_hash], prompt)
+            if part_code is None:
+                return None
+            code.append(part_code)
+        
+        self.manifest.save()
+        print(f"Scenarios: {self.manifest.summary()}")
+        return code[0] + "\n\n// TEST CASES\n" + "\n\n".join(code[1:])
+    
     def generate(self):
         """Main generation workflow"""
         print("Analyzing test data patterns...")
         patterns = self._extract_patterns()
         
+        if self.manifest is not None:
+            test_code = self._generate_incremental(patterns)
+            if test_code:
+                self._save_test_file(test_code)
+                print("Test generation completed successfully!")
+            else:
+                print("Test generation failed")
+            return
+        
         print("Generating LLM prompt...")
         prompt = self._generate_llm_prompt(patterns)
         
@@ -163,8 +307,11 @@ OUTPUT REQUIREMENTS:
             print("Test generation failed")
 
 if __name__ == "__main__":
+    # Part-by-part generation with a manifest is opt-in; by default the whole file comes from one prompt
+    incremental = os.environ.get("PLAYWRIGHT_INCREMENTAL", "").lower() in ("1", "true", "yes")
     generator = PlaywrightTestGenerator(
         test_data_path="test_data.json",
-        feature_file_path="generated_tests.feature"
+        feature_file_path="generated_tests.feature",
+        manifest_path="generated_tests/playwright_tests.js.manifest.json" if incremental else None
     )
     generator.generate()
\ No newline at end of file
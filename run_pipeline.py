@@ -0,0 +1,160 @@
+#!/usr/bin/env python3
+"""Run the whole generation flow as one pipeline, skipping stages whose inputs did not change.
+
+    python run_pipeline.py [stage ...] [--pdf docs/cahier.pdf] [--build-dir build] [--force]
+
+Stages: extract_pdf, load_catalog, gherkin, generic_scenarios, blueprint,
+classify, match_elements, generate_tests. Naming stages runs only them and
+what they depend on.
+"""
+import argparse
+import importlib.util
+import json
+import os
+from pathlib import Path
+
+from blackbox.llm_cache import get_cache
+from blackbox.manifest import Manifest, catalog_version, manifest_path_for
+from blackbox.pipeline import Pipeline, Stage
+
+ROOT = Path(__file__).resolve().parent
+
+
+def load_script(relative_path):
+    """Import one of the repo scripts by path (several of them are called model.py)"""
+    name = "pipeline_" + relative_path.replace("/", "_").replace(".py", "")
+    spec = importlib.util.spec_from_file_location(name, ROOT / relative_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def read_text(path):
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+def write_text(path, content):
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(content)
+
+
+def build_stages(pdf_path, ui_path, api_path, build_dir, model, scenario_workers, batch_setting):
+    doc_text = build_dir / "doc_text.txt"
+    catalog = build_dir / "catalog.json"
+    feature = build_dir / "generated_tests.feature"
+    generic_feature = build_dir / "generic_blackbox_scenarios.feature"
+    blueprint = build_dir / "test_blueprint.json"
+    classified = build_dir / "enhanced_blueprint.json"
+    matched = build_dir / "enhanced_blueprint_final.json"
+    tests = build_dir / "generated_tests.py"
+
+    def extract_pdf(stage):
+        text = load_script("model/model.py").extract_text_from_pdf(str(pdf_path))
+        if not text.strip():
+            print("🚫 No documentation text extracted.")
+            return False
+        write_text(doc_text, text)
+        print(f"📄 PDF text extracted. Length: {len(text)} characters.")
+        return True
+
+    def load_catalog(stage):
+        with open(ui_path, "r", encoding="utf-8") as f:
+            ui_elements = json.load(f)
+        with open(api_path, "r", encoding="utf-8") as f:
+            api_calls = json.load(f)
+        with open(catalog, "w", encoding="utf-8") as f:
+            json.dump({"ui_elements": ui_elements, "api_calls": api_calls}, f, indent=2)
+        print(f"📁 Catalog: {len(ui_elements)} UI elements, {len(api_calls)} API calls")
+        return True
+
+    def gherkin(stage):
+        module = load_script("model/model.py")
+        text = read_text(doc_text)
+        if module.generate_gherkin_from_doc(text, model=model, output_file=str(feature)):
+            return True
+        print("🔁 Trying fallback model: openhermes-2.5-mistral...")
+        return module.generate_gherkin_from_doc(text, model="openhermes-2.5-mistral", output_file=str(feature))
+
+    def generic_scenarios(stage):
+        module = load_script("scenario/model.py")
+        manifest = Manifest(manifest_path_for(generic_feature))
+        transformed = module.process_feature_file(read_text(feature), workers=scenario_workers, manifest=manifest)
+        if not transformed:
+            return False
+        manifest.save()
+        write_text(generic_feature, module.create_generic_feature_file(transformed))
+        return True
+
+    def build_blueprint(stage):
+        processor = load_script("transform/apiorui.py").BlueprintProcessor
+        data = processor.from_feature(read_text(generic_feature), generic_feature.name)
+        with open(blueprint, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2)
+        return bool(data["scenarios"])
+
+    def classify(stage):
+        return load_script("transform/apiorui.py").BlueprintProcessor.process_file(str(blueprint), str(classified))
+
+    def match_elements(stage):
+        module = load_script("transform/data.py")
+        with open(catalog, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        ui_elements, api_calls = data["ui_elements"], data["api_calls"]
+        batch_size = None if batch_setting == "off" else int(batch_setting)
+        manifest = Manifest(manifest_path_for(matched), catalog=catalog_version(ui_elements, api_calls, batch_setting))
+        enhanced = module.enhance_blueprint(module.load_json_file(classified), ui_elements, api_calls,
+                                            batch_size=batch_size, manifest=manifest)
+        module.save_enhanced_blueprint(enhanced, matched)
+        manifest.save()
+        return True
+
+    def generate_tests(stage):
+        return load_script("testo/modelo.py").generate_tests(str(matched), str(tests))
+
+    return [
+        Stage("extract_pdf", extract_pdf, inputs=[pdf_path], outputs=[doc_text]),
+        Stage("load_catalog", load_catalog, inputs=[ui_path, api_path], outputs=[catalog]),
+        Stage("gherkin", gherkin, inputs=[doc_text], outputs=[feature], params={"model": model}),
+        Stage("generic_scenarios", generic_scenarios, inputs=[feature], outputs=[generic_feature]),
+        Stage("blueprint", build_blueprint, inputs=[generic_feature], outputs=[blueprint],
+              ignore=["metadata.generated_at"]),
+        Stage("classify", classify, inputs=[blueprint], outputs=[classified]),
+        Stage("match_elements", match_elements, inputs=[classified, catalog], outputs=[matched],
+              params={"batch": batch_setting}),
+        Stage("generate_tests", generate_tests, inputs=[matched], outputs=[tests]),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the black-box test generation pipeline")
+    parser.add_argument("stages", nargs="*", help="stages to run (default: all)")
+    parser.add_argument("--pdf", default=ROOT / "docs" / "cahier.pdf", type=Path)
+    parser.add_argument("--ui", default=ROOT / "testo" / "ui_elements.json", type=Path)
+    parser.add_argument("--api", default=ROOT / "testo" / "api_calls.json", type=Path)
+    parser.add_argument("--build-dir", default=ROOT / "build", type=Path)
+    parser.add_argument("--model", default="mistral:instruct", help="model for Gherkin generation")
+    parser.add_argument("--workers", type=int, default=int(os.environ.get("PIPELINE_WORKERS", "4")),
+                        help="stages run in parallel")
+    parser.add_argument("--force", action="store_true", help="re-run every stage")
+    args = parser.parse_args()
+
+    stages = build_stages(
+        args.pdf, args.ui, args.api, args.build_dir, args.model,
+        scenario_workers=int(os.environ.get("SCENARIO_WORKERS", "4")),
+        batch_setting=os.environ.get("STEP_BATCH_SIZE", "0"),
+    )
+    unknown = [name for name in args.stages if name not in {stage.name for stage in stages}]
+    if unknown:
+        parser.error(f"unknown stage(s): {', '.join(unknown)}")
+
+    pipeline = Pipeline(stages, args.build_dir / ".pipeline_state.json", workers=args.workers, force=args.force)
+    ok = pipeline.run(args.stages or None)
+
+    stats = get_cache().stats()
+    print(f"💾 LLM cache: {stats['hits']} hits, {stats['misses']} misses")
+    raise SystemExit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
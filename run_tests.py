@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+"""Run the generated test suites in parallel shards and merge the results into one report.
+
+    python run_tests.py [test file ...] [--shards N] [--durations FILE] [--junit FILE]
+
+Python files (testo/generated_tests.py) run with pytest, .js files
+(generated_tests/playwright_tests.js) with the Playwright test runner. Tests
+are split across N worker processes so that every shard takes about the
+same time, using the per-test durations recorded by earlier runs.
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from blackbox.sharding import balance_shards, load_durations, parse_junit, save_durations, write_junit
+
+ROOT = Path(__file__).resolve().parent
+
+
+class PytestRunner:
+    """Collects pytest node ids and runs a subset of them
+
+    Both run from the test file's directory, which is also the rootdir, so
+    collected node ids can be passed back to pytest as they are.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.options = ["-p", "no:cacheprovider", f"--rootdir={path.parent}"]
+
+    def collect(self):
+        result = subprocess.run(
+            [sys.executable, "-m", "pytest", "--collect-only", "-q", *self.options, str(self.path)],
+            capture_output=True, text=True, cwd=self.path.parent,
+        )
+        test_ids = [line.strip() for line in result.stdout.splitlines() if "::" in line]
+        if not test_ids:
+            print(f"❌ No tests collected from {self.path}:\n{result.stdout[-2000:]}{result.stderr[-2000:]}")
+        return test_ids
+
+    def command(self, test_ids, junit_path):
+        return [
+            sys.executable, "-m", "pytest", "-q", *self.options, "-o", "junit_family=xunit1", f"--junitxml={junit_path}", *test_ids,
+        ], None
+
+    def case_id(self, case, test_ids):
+        """Node id of a JUnit test case among the ids the shard ran"""
+        class_name = case["classname"].rsplit(".", 1)[-1]
+        for test_id in test_ids:
+            parts = test_id.split("::")
+            if parts[-1] == case["name"] and (len(parts) == 2 or parts[-2] == class_name):
+                return test_id
+        return None
+
+
+class PlaywrightRunner:
+    """Collects Playwright test titles and runs a subset of them with --grep"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def collect(self):
+        result = subprocess.run(
+            ["npx", "playwright", "test", str(self.path), "--list"],
+            capture_output=True, text=True, cwd=self.path.parent,
+        )
+        test_ids = []
+        for line in result.stdout.splitlines():
+            # "  [chromium] › playwright_tests.js:12:5 › Register"
+            parts = [part.strip() for part in line.split(" › ")]
+            if len(parts) >= 3 and re.search(r":\d+:\d+$", parts[1]):
+                test_id = " › ".join([self.path.name] + parts[2:])
+                if test_id not in test_ids:
+                    test_ids.append(test_id)
+        if not test_ids:
+            print(f"❌ No tests listed from {self.path}:\n{result.stdout[-2000:]}{result.stderr[-2000:]}")
+        return test_ids
+
+    def command(self, test_ids, junit_path):
+        # --grep sees "<project> <file> <describe ...> <title>"; match the whole path from the file name on
+        grep = "(" + "|".join(
+            r"(?:^|[\s/])" + r"\s".join(re.escape(part) for part in test_id.split(" › ")) + "$"
+            for test_id in test_ids
+        ) + ")"
+        env = dict(os.environ, PLAYWRIGHT_JUNIT_OUTPUT_NAME=str(junit_path))
+        return ["npx", "playwright", "test", str(self.path), "--workers=1", "--reporter=junit", "--grep", grep], env
+
+    def case_id(self, case, test_ids):
+        """Test id whose describe and test titles are exactly the JUnit case name"""
+        file_name = case["classname"].replace("\\", "/").rsplit("/", 1)[-1]
+        for test_id in test_ids:
+            test_file, *titles = test_id.split(" › ")
+            if case["name"] in (" ".join(titles), " › ".join(titles)) and file_name in ("", test_file):
+                return test_id
+        return None
+
+
+def runner_for(path):
+    return PlaywrightRunner(path) if path.suffix in (".js", ".ts") else PytestRunner(path)
+
+
+def run_shard(number, groups, work_dir):
+    """Run one shard's tests, file by file; returns (cases, seconds)"""
+    start = time.perf_counter()
+    cases = []
+    for index, (runner, test_ids) in enumerate(groups):
+        junit_path = Path(work_dir) / f"shard-{number}-{index}.xml"
+        command, env = runner.command(test_ids, junit_path.resolve())
+        result = subprocess.run(command, capture_output=True, text=True, env=env, cwd=runner.path.parent)
+
+        reported = {}
+        for case in parse_junit(junit_path):
+            test_id = runner.case_id(case, test_ids)
+            if test_id is not None:
+                reported[test_id] = dict(case, id=test_id)
+        for test_id in test_ids:
+            # A test the report does not mention never ran (collection error, crashed worker, ...)
+            cases.append(reported.get(test_id) or {
+                "id": test_id, "name": test_id, "classname": str(runner.path), "file": None,
+                "outcome": "failed", "duration": 0.0,
+                "message": f"no result (exit code {result.returncode}): {result.stderr.strip()[-300:]}",
+            })
+    return cases, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run generated tests in duration-balanced parallel shards")
+    parser.add_argument("tests", nargs="*", type=Path, default=[ROOT / "testo" / "generated_tests.py"],
+                        help="generated test files (.py for pytest, .js for Playwright)")
+    parser.add_argument("--shards", type=int, default=int(os.environ.get("TEST_SHARDS", os.cpu_count() or 1)),
+                        help="worker processes")
+    parser.add_argument("--durations", type=Path, default=ROOT / ".test_durations.json",
+                        help="per-test durations from earlier runs")
+    parser.add_argument("--junit", type=Path, default=ROOT / "build" / "test-report.xml",
+                        help="merged JUnit XML report")
+    args = parser.parse_args()
+
+    runners = {}
+    owner = {}
+    test_ids = []
+    for path in args.tests:
+        runner = runner_for(path.resolve())
+        for test_id in runner.collect():
+            owner[test_id] = runner
+            test_ids.append(test_id)
+        runners[path] = runner
+    if not test_ids:
+        raise SystemExit(1)
+
+    durations = load_durations(args.durations)
+    shards = balance_shards(test_ids, durations, args.shards)
+    print(f"🧪 {len(test_ids)} tests in {len(shards)} shard(s)")
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as work_dir, ThreadPoolExecutor(max_workers=len(shards)) as executor:
+        futures = []
+        for number, (shard_ids, _) in enumerate(shards, 1):
+            groups = [
+                (runner, [test_id for test_id in shard_ids if owner[test_id] is runner])
+                for runner in runners.values()
+            ]
+            futures.append(executor.submit(run_shard, number, [group for group in groups if group[1]], work_dir))
+        outcomes = [future.result() for future in futures]
+    wall = time.perf_counter() - start
+
+    results = []
+    all_cases = []
+    for number, ((shard_ids, predicted), (cases, elapsed)) in enumerate(zip(shards, outcomes), 1):
+        passed = sum(case["outcome"] == "passed" for case in cases)
+        print(f"  Shard {number}: {len(shard_ids)} tests, predicted {predicted:.1f}s, took {elapsed:.1f}s, {passed} passed")
+        results.append((f"shard-{number}", cases))
+        all_cases.extend(cases)
+
+    save_durations(args.durations, {case["id"]: case["duration"] for case in all_cases if case["duration"] > 0})
+    write_junit(args.junit, results)
+
+    failed = [case for case in all_cases if case["outcome"] == "failed"]
+    for case in failed:
+        print(f"❌ {case['id']}: {case['message'].splitlines()[0] if case['message'] else 'failed'}")
+    skipped = sum(case["outcome"] == "skipped" for case in all_cases)
+    test_time = sum(case["duration"] for case in all_cases)
+    print(f"{'✅' if not failed else '❌'} {len(all_cases) - len(failed) - skipped} passed, {len(failed)} failed, "
+          f"{skipped} skipped in {wall:.1f}s wall ({test_time:.1f}s of test time)")
+    print(f"📄 Report: {args.junit}")
+    raise SystemExit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
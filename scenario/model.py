@@ -1,56 +1,60 @@
 #!/usr/bin/env python3
-import subprocess
+import os
 import re
 import json
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 
-def call_mistral(prompt, model="mistral"):
-    """Call Ollama Mistral with the given prompt"""
-    cmd = ["ollama", "run", model, prompt]
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.gherkin import expand_outline, format_step, iter_scenarios, iter_scenarios_from_text
+from blackbox.llm_cache import get_cache
+from blackbox.manifest import Manifest, manifest_path_for, scenario_keys
+from blackbox.ollama_client import OllamaError, generate, stream
+from blackbox.recording import compact_recorded_feature
+
+# Strip recorder noise (focus clicks, repeated fills; full-page texts in recorder output only) before transforming
+COMPACT_RECORDINGS = os.environ.get("COMPACT_RECORDINGS", "1").lower() not in ("0", "false", "no")
+SHARE_DUPLICATE_SCENARIOS = os.environ.get("SHARE_DUPLICATE_SCENARIOS", "1").lower() not in ("0", "false", "no")
+
+def call_mistral(prompt, model="mistral", stop_when=None):
+    """Call Ollama Mistral with the given prompt
     
+    With stop_when the answer is streamed and cut off once stop_when(partial) is true.
+    """
     try:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding="utf-8",
-            errors="replace"
-        )
-        
-        stdout, stderr = process.communicate()
-        
-        if process.returncode != 0:
-            print(f"Error running Ollama: {stderr}")
-            return None
-            
-        return stdout.strip()
+        if stop_when is not None:
+            return "".join(stream(prompt, model=model, stop_when=stop_when)).strip()
+        return generate(prompt, model=model).strip()
         
+    except OllamaError as e:
+        print(f"Error running Ollama: {e}")
+        return None
     except Exception as e:
         print(f"Exception occurred: {e}")
         return None
 
 def extract_scenarios_from_feature(feature_content):
-    """Extract individual scenarios from Gherkin feature file"""
-    scenarios = []
-    current_scenario = None
+    """Extract individual scenarios from Gherkin feature file
     
-    lines = feature_content.strip().split('\n')
-    
-    for line in lines:
-        line = line.strip()
-        if line.startswith('Scenario:'):
-            if current_scenario:
-                scenarios.append(current_scenario)
-            current_scenario = {
-                'name': line.replace('Scenario:', '').strip(),
-                'steps': []
-            }
-        elif line and current_scenario and (line.startswith('Given') or line.startswith('When') or line.startswith('And') or line.startswith('Then')):
-            current_scenario['steps'].append(line)
+    feature_content is the feature text or a feature file opened in binary
+    mode. Each scenario is transformed on its own, so Background steps are
+    prepended and Scenario Outlines are expanded into one scenario per
+    Examples row.
+    """
+    scenarios = []
+    if isinstance(feature_content, str):
+        parsed = iter_scenarios_from_text(feature_content)
+    else:
+        parsed = iter_scenarios(feature_content)
     
-    if current_scenario:
-        scenarios.append(current_scenario)
+    for scenario in parsed:
+        for concrete in expand_outline(scenario):
+            scenarios.append({
+                'name': concrete['name'],
+                'steps': [format_step(step) for step in concrete['background'] + concrete['steps']]
+            })
     
     return scenarios
 
@@ -117,31 +121,116 @@ Only return the transformed scenario, nothing else."""
     else:
         return f"Error transforming scenario: {scenario['name']}"
 
-def process_feature_file(feature_content):
-    """Process entire feature file and transform all scenarios"""
+def dedup_key(scenario):
+    """What the transformation depends on: the page context and the steps without input values"""
+    steps = [re.sub(r'(\bI enter )"[^"]*"', r'\1""', step) for step in scenario['steps']]
+    return (determine_page_context(scenario['name']), *steps)
+
+def fan_out_transformation(transformed, source, scenario):
+    """Reuse a representative's transformation for a duplicate scenario under its own name"""
+    return transformed.replace(f"Scenario: {source['name']}", f"Scenario: {scenario['name']}", 1)
+
+def timed_transform_scenario(scenario):
+    """Transform a single scenario and return (result, latency in seconds)"""
+    start = time.perf_counter()
+    transformed = transform_scenario(scenario)
+    return transformed, time.perf_counter() - start
+
+def process_feature_file(feature_content, workers=1, manifest=None,
+                         share_duplicates=SHARE_DUPLICATE_SCENARIOS, compact=COMPACT_RECORDINGS):
+    """Process entire feature file and transform all scenarios
+    
+    With workers > 1 the scenarios are sent to the model concurrently;
+    results are still returned in the original scenario order. With a
+    manifest, unchanged scenarios reuse their previous transformation.
+    With share_duplicates, scenarios whose steps are exactly the same once
+    input values are masked are transformed once and share the first one's
+    result under their own names; no similarity threshold applies, since
+    the answer repeats every step. With compact, clicks and fills are first
+    cleaned by compact_recorded_feature, which also shrinks page texts when
+    the feature is recorder output and needs the whole text; otherwise a
+    feature file opened in binary mode is parsed as it is read.
+    """
+    if compact:
+        if not isinstance(feature_content, str):
+            feature_content = feature_content.read().decode('utf-8')
+        feature_content, stats = compact_recorded_feature(feature_content)
+        if stats['steps_after'] < stats['steps_before'] or stats['assertions_shrunk']:
+            print(f"🧹 Compacted recording: {stats['steps_before']} → {stats['steps_after']} steps "
+                  f"({stats['clicks_dropped']} no-op clicks, {stats['fills_collapsed']} repeated fills, "
+                  f"{stats['assertions_shrunk']} page texts shrunk)")
+    
     scenarios = extract_scenarios_from_feature(feature_content)
     
     if not scenarios:
         print("No scenarios found in the feature file")
         return None
     
-    print(f"Found {len(scenarios)} scenarios to transform...")
+    keys = scenario_keys([scenario['name'] for scenario in scenarios])
+    cached = {}
+    if manifest is not None:
+        for i, (key, scenario) in enumerate(zip(keys, scenarios)):
+            output = manifest.lookup(key, scenario)
+            if output is not None:
+                cached[i] = output
+    pending = [i for i in range(len(scenarios)) if i not in cached]
     
-    transformed_scenarios = []
+    # Only one scenario per group of identical masked scenarios goes to the model
+    representative_of = {i: i for i in pending}
+    if share_duplicates:
+        first_with_key = {}
+        for i in pending:
+            representative_of[i] = first_with_key.setdefault(dedup_key(scenarios[i]), i)
+    duplicates = [i for i in pending if representative_of[i] != i]
+    pending = [i for i in pending if representative_of[i] == i]
+    
+    workers = max(1, min(workers, len(pending) or 1))
+    print(f"Found {len(scenarios)} scenarios to transform ({len(cached)} unchanged, "
+          f"{len(duplicates)} duplicate(s), {workers} worker(s))...")
     
-    for i, scenario in enumerate(scenarios, 1):
-        print(f"Transforming scenario {i}/{len(scenarios)}: {scenario['name']}")
+    for i in pending:
+        scenario = scenarios[i]
+        print(f"Queued scenario {i + 1}/{len(scenarios)}: {scenario['name']}")
         
         # Show which page context was determined
         page_context = determine_page_context(scenario['name'])
         print(f"  → Using: {page_context}")
-        
-        transformed = transform_scenario(scenario)
-        if transformed:
+    
+    results = {i: (output, 0.0) for i, output in cached.items()}
+    start = time.perf_counter()
+    
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        results.update(zip(pending, executor.map(timed_transform_scenario, [scenarios[i] for i in pending])))
+    
+    for i in duplicates:
+        source = representative_of[i]
+        transformed, _ = results[source]
+        if transformed and not transformed.startswith("Error transforming scenario:"):
+            transformed = fan_out_transformation(transformed, scenarios[source], scenarios[i])
+        results[i] = (transformed, 0.0)
+    
+    transformed_scenarios = []
+    for i, scenario in enumerate(scenarios):
+        transformed, latency = results[i]
+        if i in cached:
             transformed_scenarios.append(transformed)
+            print(f"Reused scenario {i + 1}/{len(scenarios)}: {scenario['name']}")
+        elif transformed:
+            transformed_scenarios.append(transformed)
+            if i in representative_of and representative_of[i] != i:
+                print(f"Shared scenario {i + 1}/{len(scenarios)}: {scenario['name']} "
+                      f"(duplicate of {scenarios[representative_of[i]]['name']})")
+            else:
+                print(f"Transformed scenario {i + 1}/{len(scenarios)}: {scenario['name']} ({latency:.1f}s)")
+            if manifest is not None and not transformed.startswith("Error transforming scenario:"):
+                manifest.record(keys[i], scenario, transformed)
         else:
-            print(f"Failed to transform scenario: {scenario['name']}")
+            print(f"Failed to transform scenario: {scenario['name']} ({latency:.1f}s)")
     
+    print(f"⏱️ Transformed {len(pending)} scenarios in {time.perf_counter() - start:.1f}s")
+    if duplicates:
+        print(f"🧬 Duplicates: {len(duplicates)} scenario(s) shared a representative's result, "
+              f"{len(duplicates)} LLM call(s) saved")
     return transformed_scenarios
 
 def create_generic_feature_file(transformed_scenarios):
@@ -169,10 +258,12 @@ def main():
     else:
         feature_file = default_feature_file
     
-    # Read feature file content
+    # Number of scenarios transformed in parallel (Ollama's OLLAMA_NUM_PARALLEL slots)
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else int(os.environ.get("SCENARIO_WORKERS", "4"))
+    
+    # Open the feature file; scenarios are parsed from it as it is read
     try:
-        with open(feature_file, 'r', encoding='utf-8') as f:
-            feature_content = f.read()
+        feature_handle = open(feature_file, 'rb')
         print(f"✅ Successfully loaded feature file: {feature_file}")
     except FileNotFoundError:
         print(f"❌ Feature file not found: {feature_file}")
@@ -182,17 +273,30 @@ def main():
         print(f"❌ Error reading feature file: {e}")
         return
 
+    # Output goes in the same directory as the input file
+    input_dir = os.path.dirname(feature_file) if os.path.dirname(feature_file) else "."
+    output_filename = os.path.join(input_dir, "generic_blackbox_scenarios.feature")
+    
+    # Per-scenario hashes from the previous run, so only edited scenarios are re-sent
+    manifest = Manifest(manifest_path_for(output_filename))
+    
     print("Starting black-box scenario transformation...")
     print("🔄 Converting technical scenarios to generic user flows...")
     print("=" * 60)
     
     # Process the feature file
-    transformed_scenarios = process_feature_file(feature_content)
+    with feature_handle:
+        transformed_scenarios = process_feature_file(feature_handle, workers=workers, manifest=manifest)
     
     if not transformed_scenarios:
         print("❌ No scenarios were successfully transformed")
         return
     
+    manifest.save()
+    stats = get_cache().stats()
+    print(f"💾 LLM cache: {stats['hits']} hits, {stats['misses']} misses")
+    print(f"🧾 Scenarios: {manifest.summary()}")
+    
     print("=" * 60)
     print("📝 Creating generic feature file...")
     
@@ -200,10 +304,6 @@ def main():
     generic_feature = create_generic_feature_file(transformed_scenarios)
     
     # Save to file in the same directory as the input file
-    import os
-    input_dir = os.path.dirname(feature_file) if os.path.dirname(feature_file) else "."
-    output_filename = os.path.join(input_dir, "generic_blackbox_scenarios.feature")
-    
     try:
         with open(output_filename, 'w', encoding='utf-8') as f:
             f.write(generic_feature)
@@ -1,5 +1,9 @@
 import json
-import subprocess
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.ollama_client import generate
 
 def generate_prompt_creator(ui_elements_json, api_endpoints_json):
     """
@@ -54,37 +58,20 @@ def run_prompt_generator(ui_file_path, api_file_path):
     prompt_creator = generate_prompt_creator(ui_data, api_data)
     
     # Run with Ollama to get the final prompt
-    cmd = ['ollama', 'run', 'mistral', prompt_creator]
-    
     try:
-        process = subprocess.Popen(
-            cmd,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            text=True,
-            encoding='utf-8',
-            errors='replace'
-        )
+        generated_prompt = generate(prompt_creator, model='mistral').strip()
         
-        stdout, stderr = process.communicate()
+        # Save the generated prompt
+        with open('final_prompt.txt', 'w') as f:
+            f.write(generated_prompt)
         
-        if process.returncode == 0:
-            generated_prompt = stdout.strip()
-            
-            # Save the generated prompt
-            with open('final_prompt.txt', 'w') as f:
-                f.write(generated_prompt)
-            
-            print("✅ Generated prompt saved to: final_prompt.txt")
-            print("\n" + "="*60)
-            print("GENERATED PROMPT:")
-            print("="*60)
-            print(generated_prompt)
-            
-            return generated_prompt
-        else:
-            print(f"❌ Error: {stderr}")
-            return None
+        print("✅ Generated prompt saved to: final_prompt.txt")
+        print("\n" + "="*60)
+        print("GENERATED PROMPT:")
+        print("="*60)
+        print(generated_prompt)
+        
+        return generated_prompt
             
     except Exception as e:
         print(f"❌ Exception: {str(e)}")
@@ -1,16 +1,116 @@
 import json
-import subprocess
+import os
 import re
+import sys
+import textwrap
+from pathlib import Path
+from urllib.parse import urlsplit
 
-# Load the test blueprint JSON file
-with open('enhanced_blueprint.json', 'r', encoding='utf-8') as f:
-    blueprint_data = json.load(f)
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.gherkin import common_prefix_length
+from blackbox.ollama_client import OllamaError, generate
 
-# Build prompt with updated instructions
-prompt = """
+# "template" writes the code for mappable steps directly; "llm" sends the whole blueprint to the model
+TEST_EMITTER = os.environ.get("TEST_EMITTER", "template")
+
+# Every generated file starts with these fixtures: one browser per session, a fresh context per test,
+# and contexts that start logged in from a storage state saved once per user
+FIXTURES_HEADER = '''import base64
+import json
+import os
+import time
+import urllib.request
+from pathlib import Path
+from urllib.parse import urlsplit
+
+import pytest
+import pytest_asyncio
+from playwright.async_api import async_playwright
+
+BASE_URL = os.environ.get("BASE_URL", "http://localhost:3001")
+API_URL = os.environ.get("API_URL", "http://localhost:3000")
+HEADLESS = os.environ.get("HEADLESS", "1") != "0"
+TEST_USERNAME = os.environ.get("TEST_USERNAME", "")
+TEST_PASSWORD = os.environ.get("TEST_PASSWORD", "")
+AUTH_STATE_DIR = Path(os.environ.get("AUTH_STATE_DIR", ".auth"))
+
+# Tests and fixtures share one event loop so the session browser can serve every test
+pytestmark = pytest.mark.asyncio(loop_scope="session")
+
+
+@pytest_asyncio.fixture(scope="session", loop_scope="session")
+async def browser():
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=HEADLESS)
+        yield browser
+        await browser.close()
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def page(browser):
+    context = await browser.new_context(base_url=BASE_URL)
+    page = await context.new_page()
+    yield page
+    await context.close()
+
+
+def token_expired(token, margin=60):
+    payload = token.split(".")[1]
+    claims = json.loads(base64.urlsafe_b64decode(payload + "=" * (-len(payload) % 4)))
+    return claims.get("exp", float("inf")) - margin < time.time()
+
+
+def storage_state(username, password):
+    """Storage state file logged in as username through the backend's /login, reused while its JWT is valid"""
+    path = AUTH_STATE_DIR / f"{username or 'default'}.json"
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            token = json.load(f)["origins"][0]["localStorage"][0]["value"]
+        if not token_expired(token):
+            return str(path)
+    except (OSError, ValueError, KeyError, IndexError):
+        pass
+
+    request = urllib.request.Request(
+        f"{API_URL}/login",
+        data=json.dumps({"username": username, "password": password}).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(request, timeout=10) as response:
+        token = json.load(response)["token"]
+
+    # The frontend reads the JWT from localStorage["token"] on load
+    origin = "{0.scheme}://{0.netloc}".format(urlsplit(BASE_URL))
+    state = {"cookies": [], "origins": [{"origin": origin, "localStorage": [{"name": "token", "value": token}]}]}
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp_path, path)
+    return str(path)
+
+
+@pytest_asyncio.fixture(loop_scope="session")
+async def login_as(browser):
+    """Open pages whose context starts logged in as a user (TEST_USERNAME by default)"""
+    contexts = []
+
+    async def open_page(username=TEST_USERNAME, password=TEST_PASSWORD):
+        context = await browser.new_context(base_url=BASE_URL, storage_state=storage_state(username, password))
+        contexts.append(context)
+        return await context.new_page()
+
+    yield open_page
+    for context in contexts:
+        await context.close()
+'''
+
+# Prompt instructions; the blueprint JSON is appended
+PROMPT_TEMPLATE = """
 You are a Python test generator.
 
-You will be given a JSON array of test scenarios. Each scenario includes:
+You will be given a JSON array of test scenarios, or an object with that array under
+`scenarios` and a `background` list of steps every scenario starts with. Each scenario includes:
 - `title`: the name of the test
 - `steps`: a sequence of test actions
 
@@ -22,19 +122,28 @@ Each step contains:
 ## Your task:
 Generate a valid Python test file using Playwright and Pytest.
 
+The file already starts with the imports, a session-scoped `browser` fixture and a `page`
+fixture giving each test a fresh browser context whose `base_url` is set, a `login_as` fixture
+(`page = await login_as("USERNAME", "PASSWORD")` opens a page that is already logged in) and a
+module-level `pytestmark` for asyncio. Write ONLY what comes after them.
+
 ### Guidelines:
-- One test function per scenario
-- Use `async def` and `@pytest.mark.asyncio`
-- Use `async_playwright()` to create Playwright instance
-- Use `browser.new_page()` (not `newPage()`)
-- Do not use `Playwright.create()` — it doesn't exist
+- One test function per scenario: `async def test_<title in snake_case>(page):`
+- Use the `page` fixture; NEVER call `async_playwright()`, `chromium.launch()` or `new_page()`
+- Do not add imports, `@pytest.mark.asyncio` or browser setup
+- Navigate with the relative path from the JSON (`page.goto("/path")`), the base URL is already set
 - Use only valid Playwright Python API
-- Each function must be named based on its `title`, converted to snake_case
+- When a scenario logs in and then does more (fills the username and password, clicks login, then
+  other steps), or has an `authenticate` step, take `login_as` and open the page with
+  `page = await login_as(...)` instead of replaying the login form; then navigate as usual
 - Use only exact values from the JSON (black-box test)
 - DO NOT invent selectors, test data, or logic
 - Do NOT reference `response_status` unless it's explicitly in the DOM
 - Do NOT add comments, markdown, or explanation text
 - Output pure Python code — no ``` fences, no extra headers
+- If a `background` is given, emit ONE `@pytest_asyncio.fixture(loop_scope="session")` named
+  `background_page` that takes `page`, performs the background steps and yields it; every test
+  function takes `background_page` as its page and NEVER repeats the background steps
 
 ### Step Type to Code Mapping:
 
@@ -48,20 +157,29 @@ Generate a valid Python test file using Playwright and Pytest.
 Now generate test functions using this blueprint:
 """
 
-# Append formatted blueprint JSON to prompt
-prompt += "\n" + json.dumps(blueprint_data, indent=2)
 
-# Run prompt with Ollama and Mistral
-cmd = ['ollama', 'run', 'mistral', prompt]
-process = subprocess.Popen(
-    cmd,
-    stdout=subprocess.PIPE,
-    stderr=subprocess.PIPE,
-    text=True,
-    encoding='utf-8',
-    errors='replace'
-)
-stdout, stderr = process.communicate()
+def lift_common_steps(blueprint_data, min_steps=2):
+    """Move the steps every scenario starts with into a shared 'background' list
+
+    Returns {'background': [...], 'scenarios': [...]} when at least
+    min_steps leading steps are shared, else the blueprint unchanged.
+    """
+    if not isinstance(blueprint_data, list) or len(blueprint_data) < 2:
+        return blueprint_data
+    length = common_prefix_length(scenario['steps'] for scenario in blueprint_data)
+    # Each scenario keeps at least one step of its own
+    length = min([length] + [len(scenario['steps']) - 1 for scenario in blueprint_data])
+    if length < min_steps:
+        return blueprint_data
+    return {
+        'background': blueprint_data[0]['steps'][:length],
+        'scenarios': [dict(scenario, steps=scenario['steps'][length:]) for scenario in blueprint_data],
+    }
+
+
+def build_prompt(blueprint_data):
+    # Append formatted blueprint JSON to prompt
+    return PROMPT_TEMPLATE + "\n" + json.dumps(blueprint_data, indent=2)
 
 
 def clean_code_output(output: str) -> str:
@@ -69,15 +187,16 @@ def clean_code_output(output: str) -> str:
 
     # Remove any lines before the real code starts (imports or pytest defs)
     for i, line in enumerate(lines):
-        if re.match(r"^\s*(import|from|@pytest|async def|def)\b", line):
+        if re.match(r"^\s*(import|from|@pytest(_asyncio)?|async def|def)\b", line):
             lines = lines[i:]
             break
 
-    # Remove markdown code fences and unwanted headers
+    # Remove markdown code fences, unwanted headers and imports the fixtures header already has
+    header_lines = {line.strip() for line in FIXTURES_HEADER.splitlines() if line.startswith(("import", "from"))}
     cleaned_lines = []
     for line in lines:
         stripped = line.strip()
-        if stripped in ("```", "```python"):
+        if stripped in ("```", "```python") or stripped in header_lines or stripped == "import asyncio":
             continue
         if any(stripped.startswith(prefix) for prefix in [
             "Here is the", "Here’s the", "Based on your", "Below is the"
@@ -92,14 +211,213 @@ def clean_code_output(output: str) -> str:
     return "\n".join(cleaned_lines).strip() + "\n"
 
 
-# Clean up LLM output
-cleaned_code = clean_code_output(stdout)
+def python_string(value):
+    # JSON string literals are valid Python string literals
+    return json.dumps(str(value), ensure_ascii=False)
+
+
+def test_function_name(title, seen):
+    # snake_case of the title, numbered when several scenarios share it
+    name = "test_" + (re.sub(r"\W+", "_", title.lower()).strip("_") or "scenario")
+    seen[name] = seen.get(name, 0) + 1
+    return name if seen[name] == 1 else f"{name}_{seen[name]}"
+
+
+def emit_step(step):
+    """Code lines for one blueprint step following the step type table, or None if it cannot be mapped"""
+    step_type, target, value = step.get('type'), step.get('target'), step.get('value')
+    if step_type == 'navigate' and target:
+        return [f"await page.goto({python_string(target)})"]
+    if step_type == 'input' and target and value is not None:
+        return [f"await page.fill({python_string(target)}, {python_string(value)})"]
+    if step_type == 'click' and target:
+        return [f"await page.click({python_string(target)})"]
+    if step_type == 'assert':
+        return [f"assert True  # expected: {value}"]
+    if step_type == 'authenticate':
+        if step.get('username') is None:
+            return ["page = await login_as()"]
+        return [f"page = await login_as({python_string(step['username'])}, {python_string(step.get('password', ''))})"]
+    return None
+
+
+def is_login_field(step, *words):
+    return step.get('type') == 'input' and any(word in str(step.get('target', '')).lower() for word in words)
+
+
+def use_stored_login(steps):
+    """Replace a leading UI login with an authenticate step when the scenario goes on after it
+
+    A login is an optional navigate, a username and a password input and a
+    click on a login button. Scenarios that only log in and check the result
+    test the login itself and keep the UI flow.
+    """
+    start = 1 if steps and steps[0].get('type') == 'navigate' else 0
+    login = steps[start:start + 3]
+    if (
+        len(login) < 3
+        or not is_login_field(login[0], 'user', 'email')
+        or not is_login_field(login[1], 'pass')
+        or login[2].get('type') != 'click'
+        or 'login' not in str(login[2].get('target', '')).lower()
+        or all(step.get('type') == 'assert' for step in steps[start + 3:])
+    ):
+        return steps
+    authenticate = {'type': 'authenticate', 'username': login[0].get('value'), 'password': login[1].get('value')}
+    return [authenticate] + steps[:start] + steps[start + 3:]
+
+
+def generate_step_code(step):
+    """Ask the model for the code of a step the table does not cover"""
+    prompt = (
+        "Write the Playwright Python async statements for this test step, using the existing `page` "
+        "object. Output only the statements, no imports, functions or comments.\n\n"
+        + json.dumps(step)
+    )
+    try:
+        output = generate(prompt, model='mistral')
+    except OllamaError as e:
+        print(f"[!] Could not generate step {step}: {e}")
+        return None
+    lines = textwrap.dedent("\n".join(
+        line for line in output.splitlines() if line.strip() and not line.strip().startswith("```")
+    )).splitlines()
+    try:
+        # Only keep answers that are valid statements inside a test body
+        compile("async def step(page):\n" + "\n".join("    " + line for line in lines or ["pass"]), "<step>", "exec")
+    except SyntaxError:
+        print(f"[!] Model answer for step {step} is not valid Python")
+        return None
+    return lines or None
+
+
+def emit_steps(steps, indent="    "):
+    """Indented code for a list of steps, with the model filling in only unmapped ones"""
+    code = []
+    for step in steps:
+        lines = emit_step(step) or generate_step_code(step)
+        if lines is None:
+            lines = [f"pytest.fail({python_string('Step could not be generated: ' + json.dumps(step))})"]
+        code.extend(indent + line for line in lines)
+    return code
+
+
+def fixture_arguments(steps, page_fixture="page"):
+    # A scenario that starts by logging in opens its page through login_as only
+    if not any(step.get('type') == 'authenticate' for step in steps):
+        return page_fixture
+    if steps[0].get('type') == 'authenticate':
+        return "login_as"
+    return f"{page_fixture}, login_as"
+
+
+def emit_tests(blueprint_data):
+    """Python test module for a list of blueprint scenarios, written without the LLM where possible"""
+    blueprint_data = [dict(scenario, steps=use_stored_login(scenario.get('steps', []))) for scenario in blueprint_data]
+    lifted = lift_common_steps(blueprint_data)
+    background = lifted['background'] if isinstance(lifted, dict) else []
+    scenarios = lifted['scenarios'] if isinstance(lifted, dict) else lifted
+
+    code = [FIXTURES_HEADER.rstrip("\n")]
+    page_fixture = "page"
+    if background:
+        page_fixture = "background_page"
+        code += ["", "", '@pytest_asyncio.fixture(loop_scope="session")',
+                 f"async def background_page({fixture_arguments(background)}):"]
+        code += emit_steps(background)
+        code.append("    yield page")
+
+    seen = {}
+    for scenario in scenarios:
+        steps = scenario.get('steps', [])
+        arguments = fixture_arguments(steps, page_fixture)
+        code += ["", "", f"async def {test_function_name(scenario.get('title', ''), seen)}({arguments}):"]
+        if arguments.startswith("background_page"):
+            code.append("    page = background_page")
+        code += emit_steps(steps) or ["    pass"]
+    return "\n".join(code) + "\n"
+
+
+def template_step(step):
+    """A transform/data.py step (gherkin_text, UI/API type, matched data) in the step table form
+
+    Steps whose wording or matches do not fit a table row are returned
+    unchanged, so the model writes them from their Gherkin text.
+    """
+    text = re.sub(r"^(Given|When|Then|And|But|\*)\s+", "", step.get('gherkin_text', '')).strip()
+    lowered = text.lower()
+    matched = [item for item in step.get('data') or [] if isinstance(item, dict)]
+    selectors = [item['selector'] for item in matched if item.get('selector')]
+    urls = [item['url'] for item in matched if item.get('url')]
+    quoted = re.findall(r'"([^"]*)"', text)
+
+    if 'logged in' in lowered or 'authenticated' in lowered:
+        return {'type': 'authenticate'}
+    if 'should' in lowered:
+        return {'type': 'assert', 'value': quoted[0] if quoted else text}
+    if step.get('type') == 'UI':
+        if lowered.startswith(('i am on', 'i navigate', 'i go to', 'i open')) and urls:
+            # Contexts have base_url set, so the path of the matched URL is enough
+            return {'type': 'navigate', 'target': urlsplit(urls[0]).path or '/'}
+        if lowered.startswith(('i enter', 'i type', 'i fill')) and selectors:
+            return {'type': 'input', 'target': selectors[0], 'value': quoted[0] if quoted else ''}
+        if lowered.startswith(('i click', 'i press', 'i submit')) and selectors:
+            return {'type': 'click', 'target': selectors[0]}
+    return step
+
+
+def template_blueprint(blueprint_data):
+    """The blueprint as a list of {title, steps} scenarios in the step table form, or None for unknown formats"""
+    if isinstance(blueprint_data, list):
+        return blueprint_data
+    if isinstance(blueprint_data, dict) and isinstance(blueprint_data.get('scenarios'), list):
+        return [
+            {'title': scenario.get('name') or scenario.get('title', ''),
+             'steps': [template_step(step) for step in scenario.get('steps', [])]}
+            for scenario in blueprint_data['scenarios']
+        ]
+    return None
+
+
+def generate_tests(blueprint_path='enhanced_blueprint.json', output_file='generated_tests.py', emitter=None):
+    """Write the pytest-playwright tests for a blueprint; returns True on success
+
+    The step table is applied directly to blueprints from generate_blueprint.py
+    (a list of scenarios) and from transform/data.py (mapped by template_step)
+    unless emitter is "llm"; other blueprints go to the model.
+    """
+    # Load the test blueprint JSON file
+    with open(blueprint_path, 'r', encoding='utf-8') as f:
+        blueprint_data = json.load(f)
+
+    scenarios = template_blueprint(blueprint_data) if (emitter or TEST_EMITTER) == "template" else None
+    if scenarios is not None:
+        with open(output_file, 'w', encoding='utf-8') as f:
+            f.write(emit_tests(scenarios))
+        print(f"[✔] Tests generated from {len(scenarios)} scenarios and saved to: {output_file}")
+        return True
+
+    # Shared leading steps (e.g. the login) are sent once, for a single fixture
+    blueprint_data = lift_common_steps(blueprint_data)
+
+    # Run prompt with Ollama and Mistral
+    try:
+        stdout, stderr = generate(build_prompt(blueprint_data), model='mistral'), ""
+    except OllamaError as e:
+        stdout, stderr = "", str(e)
+
+    # Clean up LLM output
+    cleaned_code = clean_code_output(stdout)
+
+    # Write the shared fixtures followed by the generated tests
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(FIXTURES_HEADER + "\n\n" + cleaned_code)
+
+    print(f"[✔] Tests generated and saved to: {output_file}")
+    if stderr:
+        print(f"[!] stderr:\n{stderr}")
+    return not stderr
 
-# Write cleaned code to file
-output_file = 'generated_tests.py'
-with open(output_file, 'w', encoding='utf-8') as f:
-    f.write(cleaned_code)
 
-print(f"[✔] Tests generated and saved to: {output_file}")
-if stderr:
-    print(f"[!] stderr:\n{stderr}")
+if __name__ == "__main__":
+    generate_tests()
@@ -1,5 +1,9 @@
-import subprocess
 import json
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.ollama_client import OllamaError, generate
 
 def generate_scenario_prompt(ui_elements: list, api_traces: list) -> str:
     """
@@ -45,16 +49,11 @@ def generate_scenario_prompt(ui_elements: list, api_traces: list) -> str:
     """
 
     # Execute Ollama Mistral
-    cmd = ['ollama', 'run', 'mistral', phase1_prompt]
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        encoding='utf-8',
-        errors='replace'
-    )
-    stdout, _ = process.communicate()
+    try:
+        stdout = generate(phase1_prompt, model='mistral')
+    except OllamaError as e:
+        print(f"Error running Ollama: {e}")
+        stdout = ""
     
     # Save to file
     with open('scenario_prompt.txt', 'w') as f:
@@ -1,8 +1,12 @@
 import json
 import re
 import sys
+from datetime import datetime, timezone
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.gherkin import iter_scenarios_from_text
+
 class StepClassifier:
     """Ultimate UI/API step classifier with precise pattern matching"""
     
@@ -37,41 +41,81 @@ class StepClassifier:
         'authenticate': 4, 'authorize': 4, 'validate': 3,
         'process': 3, 'sync': 2
     }
+    
+    # Every term of both tables compiled once into a single whole-word alternation.
+    # Terms never overlap as whole words, so one finditer pass finds every hit.
+    TERM_REGEX = re.compile(
+        r"\b(?:" + "|".join(map(re.escape, sorted({**UI_PATTERNS, **API_PATTERNS}, key=len, reverse=True))) + r")\b"
+    )
+    WORD_CHAR_REGEX = re.compile(r"\w")
+    SHOULD_SEE_REGEX = re.compile(r"should (?:see|view|display)")
+    BACKEND_CHANGE_REGEX = re.compile(r"(?:created|deleted|updated) (?:in|on) (?:backend|system)")
+    
+    # Absolute markers; 'see' also needs a following word ("see "), 'api' needs spaces around it (" api ")
+    UI_MARKERS = frozenset(['click', 'button', 'page'])
+    API_MARKERS = frozenset(['status', 'endpoint'])
+
+    @classmethod
+    def _is_word_char(cls, text: str, pos: int) -> bool:
+        return 0 <= pos < len(text) and cls.WORD_CHAR_REGEX.match(text, pos) is not None
 
     @classmethod
     def classify(cls, step_text: str) -> str:
         """Classify with enhanced context awareness"""
         step_lower = step_text.lower()
         
+        # Single pass collecting every weighted term and the absolute markers
+        hits = set()
+        ui_marker = api_marker = False
+        for match in cls.TERM_REGEX.finditer(step_lower):
+            term = match.group()
+            hits.add(term)
+            if term in cls.UI_MARKERS:
+                ui_marker = True
+            elif term in cls.API_MARKERS:
+                api_marker = True
+            elif term == 'see':
+                end = match.end()
+                if step_lower[end:end + 1] == ' ' and cls._is_word_char(step_lower, end + 1):
+                    ui_marker = True
+            elif term == 'api':
+                start, end = match.start(), match.end()
+                if (step_lower[start - 1:start] == ' ' and cls._is_word_char(step_lower, start - 2)
+                        and step_lower[end:end + 1] == ' ' and cls._is_word_char(step_lower, end + 1)):
+                    api_marker = True
+        
         # Priority 1: Absolute UI markers
-        if any(re.search(rf"\b{term}\b", step_lower) 
-               for term in ['click', 'button', 'see ', 'page']):
+        if ui_marker:
             return "UI"
             
         # Priority 2: Absolute API markers
-        if any(re.search(rf"\b{term}\b", step_lower) 
-               for term in [' api ', 'status', 'endpoint']):
+        if api_marker:
             return "API"
         
         # Priority 3: Contextual patterns
-        if re.search(r"should (?:see|view|display)", step_lower):
+        if cls.SHOULD_SEE_REGEX.search(step_lower):
             return "UI"
-        if re.search(r"(?:created|deleted|updated) (?:in|on) (?:backend|system)", step_lower):
+        if cls.BACKEND_CHANGE_REGEX.search(step_lower):
             return "API"
         
         # Score calculation
-        ui_score = sum(
-            weight for term, weight in cls.UI_PATTERNS.items() 
-            if re.search(rf"\b{term}\b", step_lower)
-        )
-        api_score = sum(
-            weight for term, weight in cls.API_PATTERNS.items()
-            if re.search(rf"\b{term}\b", step_lower)
-        )
+        ui_score = sum(cls.UI_PATTERNS.get(term, 0) for term in hits)
+        api_score = sum(cls.API_PATTERNS.get(term, 0) for term in hits)
         
         # Decision with clear threshold
         return "API" if api_score > ui_score + 1 else "UI"
 
+    @classmethod
+    def classify_many(cls, step_texts) -> list:
+        """Classify a batch of steps, classifying each distinct text only once"""
+        results = {}
+        labels = []
+        for step_text in step_texts:
+            if step_text not in results:
+                results[step_text] = cls.classify(step_text)
+            labels.append(results[step_text])
+        return labels
+
 
 class BlueprintProcessor:
     """Robust JSON processor with error handling"""
@@ -84,6 +128,33 @@ class BlueprintProcessor:
             raise ValueError("Invalid blueprint structure")
         return True
     
+    @staticmethod
+    def from_feature(feature_content: str, source_feature: str) -> dict:
+        """Build an unclassified blueprint from a feature file (same layout as tran.js)"""
+        scenarios = []
+        for scenario in iter_scenarios_from_text(feature_content):
+            scenario_id = f"SC-{len(scenarios) + 1}"
+            scenarios.append({
+                "scenario_id": scenario_id,
+                "name": scenario["name"],
+                "steps": [
+                    {
+                        "step_id": f"{scenario_id}-{number:02d}",
+                        "gherkin_text": f"{step['keyword']} {step['text']}",
+                        "type": "",
+                        "data": ""
+                    }
+                    for number, step in enumerate(scenario["steps"], 1)
+                ]
+            })
+        return {
+            "scenarios": scenarios,
+            "metadata": {
+                "source_feature": source_feature,
+                "generated_at": datetime.now(timezone.utc).isoformat()
+            }
+        }
+    
     @staticmethod
     def process_file(input_path: str, output_path: str) -> bool:
         """Full processing pipeline"""
@@ -93,10 +164,15 @@ class BlueprintProcessor:
             
             BlueprintProcessor.validate_structure(data)
             
-            for scenario in data.get("scenarios", []):
-                for step in scenario.get("steps", []):
-                    if not step.get("type"):
-                        step["type"] = StepClassifier.classify(step["gherkin_text"])
+            pending = [
+                step
+                for scenario in data.get("scenarios", [])
+                for step in scenario.get("steps", [])
+                if not step.get("type")
+            ]
+            labels = StepClassifier.classify_many(step["gherkin_text"] for step in pending)
+            for step, label in zip(pending, labels):
+                step["type"] = label
             
             with open(output_path, 'w', encoding='utf-8') as f:
                 json.dump(data, f, indent=2, ensure_ascii=False)
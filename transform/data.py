@@ -1,8 +1,16 @@
+import copy
 import json
+import os
+import sys
 from pathlib import Path
-import subprocess
 import re
 
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from blackbox.dedup import DEDUP_THRESHOLD, cluster_near_duplicates, step_tokens
+from blackbox.llm_cache import get_cache
+from blackbox.manifest import Manifest, catalog_version, manifest_path_for, scenario_keys
+from blackbox.ollama_client import OllamaError, generate
+
 def load_json_file(file_path):
     """Load JSON data from a file"""
     try:
@@ -21,19 +29,18 @@ def save_enhanced_blueprint(data, output_path):
     except Exception as e:
         print(f"Error saving enhanced blueprint: {e}")
 
+# Number of LLM requests made so far (used to report what near-duplicate sharing saved)
+llm_call_count = 0
+
 def query_llm(prompt):
     """Query the local LLM for element matching"""
-    cmd = ['ollama', 'run', 'mistral', prompt]
-    process = subprocess.Popen(
-        cmd,
-        stdout=subprocess.PIPE,
-        stderr=subprocess.PIPE,
-        text=True,
-        encoding='utf-8',
-        errors='replace'
-    )
-    stdout, stderr = process.communicate()
-    return stdout.strip()
+    global llm_call_count
+    llm_call_count += 1
+    try:
+        return generate(prompt, model='mistral').strip()
+    except OllamaError as e:
+        print(f"LLM query failed: {e}")
+        return ""
 
 def extract_json_from_response(response):
     """Robust JSON extraction that handles all response formats"""
@@ -183,11 +190,16 @@ RETURN ONLY THE JSON ARRAY OF MATCHED ELEMENTS:"""
         print(f"LLM failed to return valid JSON for step: {step['step_id']}")
         return []
     
-    # Validate elements exist in original data
+    return validate_matched_elements(parsed_response, elements if element_type == "UI" else api_calls)
+
+def validate_matched_elements(parsed_response, all_elements):
+    """Keep only the LLM-matched items that exist in the original catalog"""
     valid_elements = []
-    all_elements = elements if element_type == "UI" else api_calls
     element_ids = {e['id']: e for e in all_elements} if all_elements and 'id' in all_elements[0] else {}
     
+    if not isinstance(parsed_response, list):
+        return valid_elements
+    
     for item in parsed_response:
         if not isinstance(item, dict):
             continue
@@ -205,16 +217,157 @@ RETURN ONLY THE JSON ARRAY OF MATCHED ELEMENTS:"""
     
     return valid_elements
 
-def enhance_blueprint(blueprint, ui_elements, api_calls):
-    """Enhance the blueprint with matched elements"""
-    for scenario in blueprint.get('scenarios', []):
-        for step in scenario.get('steps', []):
-            if step['type'] == 'UI':
-                step['data'] = find_matching_elements(step, scenario, ui_elements, api_calls, "UI")
-            elif step['type'] == 'API':
-                step['data'] = find_matching_elements(step, scenario, ui_elements, api_calls, "API")
+def match_steps_batch(steps, scenario, elements, catalog_json):
+    """Match a group of UI steps with a single LLM call
+    
+    Returns a dict of step_id -> validated elements. Steps the model left out
+    of its answer are missing from the dict.
+    """
+    step_lines = "\n".join(f"{step['step_id']}: {step['gherkin_text']}" for step in steps)
+    
+    prompt = f"""TEST STEP ANALYSIS REQUIREMENTS:
+1. For EACH step below: Select ONLY the elements needed for THAT SPECIFIC ACTION
+2. MUST maintain scenario flow consistency
+3. Return ONLY a JSON object mapping every step_id to a JSON array of matched elements
+
+SCENARIO: {scenario['name']}
+ALL SCENARIO STEPS: {[s['gherkin_text'] for s in scenario['steps']]}
+STEPS TO MATCH:
+{step_lines}
+
+AVAILABLE ELEMENTS:
+{catalog_json}
+
+RETURN ONLY THE JSON OBJECT, e.g. {{"{steps[0]['step_id']}": [{{"id": "..."}}]}}:"""
+
+    response = query_llm(prompt)
+    parsed_response = extract_json_from_response(response)
+    
+    if not isinstance(parsed_response, dict):
+        print(f"LLM failed to return a JSON map for scenario: {scenario['name']}")
+        return {}
+    
+    return {
+        step['step_id']: validate_matched_elements(parsed_response[step['step_id']], elements)
+        for step in steps
+        if step['step_id'] in parsed_response
+    }
+
+def enhance_scenario_batched(scenario, ui_elements, api_calls, batch_size, catalog_json):
+    """Enhance one scenario, sending its LLM-matched UI steps in groups of batch_size (0 = all at once)"""
+    llm_steps = []
+    
+    for step in scenario.get('steps', []):
+        if step['type'] == 'API':
+            step['data'] = find_matching_elements(step, scenario, ui_elements, api_calls, "API")
+        elif step['type'] == 'UI':
+            given_result = []
+            if step['gherkin_text'].strip().lower().startswith('given'):
+                given_result = handle_given_step(step['gherkin_text'], ui_elements, api_calls)
+            if given_result:
+                step['data'] = given_result
+            else:
+                llm_steps.append(step)
+        else:
+            step['data'] = []
+    
+    if not llm_steps:
+        return
+    
+    group_size = batch_size or len(llm_steps)
+    for i in range(0, len(llm_steps), group_size):
+        group = llm_steps[i:i + group_size]
+        matches = match_steps_batch(group, scenario, ui_elements, catalog_json)
+        for step in group:
+            if step['step_id'] in matches:
+                step['data'] = matches[step['step_id']]
             else:
-                step['data'] = []
+                # Fall back to a single-step request for anything the batch answer skipped
+                step['data'] = find_matching_elements(step, scenario, ui_elements, api_calls, "UI")
+
+def enhance_scenario(scenario, ui_elements, api_calls):
+    """Enhance one scenario, matching each step with its own LLM call"""
+    for step in scenario.get('steps', []):
+        if step['type'] == 'UI':
+            step['data'] = find_matching_elements(step, scenario, ui_elements, api_calls, "UI")
+        elif step['type'] == 'API':
+            step['data'] = find_matching_elements(step, scenario, ui_elements, api_calls, "API")
+        else:
+            step['data'] = []
+
+def fan_out_matches(scenario, source, ui_elements, api_calls):
+    """Copy a near-duplicate representative's matches onto scenario, step by step text
+    
+    Steps the representative does not share are matched on their own.
+    Returns the number of steps that had to be matched.
+    """
+    matched = {}
+    for step in source.get('steps', []):
+        matched.setdefault((step['type'], step['gherkin_text']), step.get('data', []))
+    
+    leftovers = 0
+    for step in scenario.get('steps', []):
+        key = (step['type'], step['gherkin_text'])
+        if key in matched:
+            step['data'] = copy.deepcopy(matched[key])
+        elif step['type'] in ('UI', 'API'):
+            step['data'] = find_matching_elements(step, scenario, ui_elements, api_calls, step['type'])
+            leftovers += 1
+        else:
+            step['data'] = []
+    return leftovers
+
+def enhance_blueprint(blueprint, ui_elements, api_calls, batch_size=None, manifest=None,
+                      dedup_threshold=DEDUP_THRESHOLD):
+    """Enhance the blueprint with matched elements
+    
+    batch_size=None matches each UI step with its own LLM call; otherwise
+    steps are matched per scenario (0) or in groups of batch_size steps.
+    With a manifest, unchanged scenarios get their previously matched steps back.
+    Near-duplicate scenarios (MinHash similarity >= dedup_threshold) reuse
+    the matches of their cluster's representative.
+    """
+    # Serialize the catalog once for every batched prompt
+    catalog_json = json.dumps(ui_elements, separators=(',', ':')) if batch_size is not None else None
+    
+    scenarios = blueprint.get('scenarios', [])
+    keys = scenario_keys([scenario.get('name', scenario.get('scenario_id')) for scenario in scenarios])
+    clusters = cluster_near_duplicates(
+        [step_tokens([scenario['name']] + [step['gherkin_text'] for step in scenario.get('steps', [])])
+         for scenario in scenarios],
+        dedup_threshold,
+    )
+    representative_of = {member: cluster[0] for cluster in clusters for member in cluster}
+    llm_calls = {}
+    shared = saved = 0
+    
+    for i, (key, scenario) in enumerate(zip(keys, scenarios)):
+        original = copy.deepcopy(scenario) if manifest is not None else None
+        if manifest is not None:
+            steps = manifest.lookup(key, original)
+            if steps is not None:
+                scenario['steps'] = steps
+                print(f"Reused matches for scenario: {key}")
+                continue
+        
+        calls_before = llm_call_count
+        source = representative_of[i]
+        if source != i and source in llm_calls:
+            leftovers = fan_out_matches(scenario, scenarios[source], ui_elements, api_calls)
+            shared += 1
+            saved += max(0, llm_calls[source] - leftovers)
+            print(f"Shared matches for scenario: {key} (near-duplicate of {keys[source]})")
+        elif batch_size is not None:
+            enhance_scenario_batched(scenario, ui_elements, api_calls, batch_size, catalog_json)
+        else:
+            enhance_scenario(scenario, ui_elements, api_calls)
+        llm_calls[i] = llm_call_count - calls_before
+        
+        if manifest is not None:
+            manifest.record(key, original, scenario.get('steps', []))
+    
+    if shared:
+        print(f"Near-duplicates: {shared} scenario(s) shared a representative's matches, ~{saved} LLM call(s) saved")
     return blueprint
 
 def main():
@@ -234,11 +387,23 @@ def main():
         print("Failed to load one or more input files")
         return
     
+    # Steps per LLM request: 0 = one request per scenario, "off" = one request per step
+    batch_setting = os.environ.get("STEP_BATCH_SIZE", "0")
+    batch_size = None if batch_setting == "off" else int(batch_setting)
+    
+    # Per-scenario hashes from the previous run, so only edited scenarios are re-matched
+    manifest = Manifest(manifest_path_for(output_path), catalog=catalog_version(ui_elements, api_calls, batch_setting))
+    
     # Enhance the blueprint
-    enhanced_blueprint = enhance_blueprint(blueprint, ui_elements, api_calls)
+    enhanced_blueprint = enhance_blueprint(blueprint, ui_elements, api_calls, batch_size=batch_size, manifest=manifest)
     
     # Save the enhanced blueprint
     save_enhanced_blueprint(enhanced_blueprint, output_path)
+    manifest.save()
+    
+    stats = get_cache().stats()
+    print(f"LLM cache: {stats['hits']} hits, {stats['misses']} misses")
+    print(f"Scenarios: {manifest.summary()}")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file